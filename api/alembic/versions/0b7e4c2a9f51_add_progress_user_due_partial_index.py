@@ -0,0 +1,27 @@
+"""add partial index on progress (user_id, due)
+
+Revision ID: 0b7e4c2a9f51
+Revises: f1a6d4b9c3e8
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0b7e4c2a9f51'
+down_revision: Union[str, None] = 'f1a6d4b9c3e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_progress_user_due', 'progress', ['user_id', 'due'],
+                    postgresql_where=sa.text('due IS NOT NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_progress_user_due', table_name='progress',
+                  postgresql_where=sa.text('due IS NOT NULL'))
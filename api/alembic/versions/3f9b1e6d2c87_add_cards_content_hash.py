@@ -0,0 +1,56 @@
+"""add cards.content_hash, indexed per deck
+
+Revision ID: 3f9b1e6d2c87
+Revises: 7d2a9c4e1b63
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+import hashlib
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9b1e6d2c87'
+down_revision: Union[str, None] = '7d2a9c4e1b63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH = 5000
+
+
+def _content_hash(front, back):
+    # Frozen copy of db_models.content_hash (NFC + casefold + trim needs Python).
+    def norm(s):
+        return unicodedata.normalize("NFC", s or "").casefold().strip()
+    return hashlib.sha1(f"{norm(front)}\x1f{norm(back)}".encode()).hexdigest()
+
+
+def upgrade() -> None:
+    op.add_column('cards', sa.Column('content_hash', sa.String(length=40), nullable=True))
+    conn = op.get_bind()
+    cards = sa.table('cards', sa.column('id'), sa.column('front'), sa.column('back'),
+                     sa.column('content_hash'))
+    last = ''
+    while True:
+        rows = conn.execute(
+            sa.select(cards.c.id, cards.c.front, cards.c.back)
+            .where(cards.c.id > last).order_by(cards.c.id).limit(BATCH)
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            cards.update().where(cards.c.id == sa.bindparam('card_id'))
+            .values(content_hash=sa.bindparam('hash')),
+            [{'card_id': r.id, 'hash': _content_hash(r.front, r.back)} for r in rows],
+        )
+        last = rows[-1].id
+    op.alter_column('cards', 'content_hash', nullable=False)
+    op.create_index('ix_cards_deck_content_hash', 'cards', ['deck_id', 'content_hash'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_cards_deck_content_hash', table_name='cards')
+    op.drop_column('cards', 'content_hash')
@@ -0,0 +1,25 @@
+"""add cards (created_at, id) index for keyset pagination
+
+Revision ID: 5c8e2f7a1d90
+Revises: d7e3a1b9c2f4
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '5c8e2f7a1d90'
+down_revision: Union[str, None] = 'd7e3a1b9c2f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_cards_created_at_id', 'cards', ['created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_cards_created_at_id', table_name='cards')
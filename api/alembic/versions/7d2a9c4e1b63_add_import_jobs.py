@@ -0,0 +1,49 @@
+"""add import_jobs table
+
+Revision ID: 7d2a9c4e1b63
+Revises: 0b7e4c2a9f51
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2a9c4e1b63'
+down_revision: Union[str, None] = '0b7e4c2a9f51'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'import_jobs',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('created_by', sa.String(), nullable=True),
+        sa.Column('deck_id', sa.String(), nullable=True),
+        sa.Column('format', sa.String(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=True),
+        sa.Column('update_existing', sa.Boolean(), nullable=False),
+        sa.Column('status', sa.String(), server_default='queued', nullable=False),
+        sa.Column('rows_total', sa.Integer(), nullable=True),
+        sa.Column('rows_parsed', sa.Integer(), nullable=False),
+        sa.Column('imported', sa.Integer(), nullable=False),
+        sa.Column('skipped', sa.Integer(), nullable=False),
+        sa.Column('updated', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_import_jobs_status_created_at', 'import_jobs',
+                    ['status', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_import_jobs_status_created_at', table_name='import_jobs')
+    op.drop_table('import_jobs')
@@ -0,0 +1,39 @@
+"""add review_receipts table
+
+Revision ID: 8f3b6d2e4a17
+Revises: 5c8e2f7a1d90
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3b6d2e4a17'
+down_revision: Union[str, None] = '5c8e2f7a1d90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'review_receipts',
+        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('idempotency_key', sa.String(), nullable=False),
+        sa.Column('card_id', sa.String(), nullable=False),
+        sa.Column('rating', sa.String(), nullable=False),
+        sa.Column('reviewed_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('due', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('review_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['card_id'], ['cards.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'idempotency_key'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('review_receipts')
@@ -0,0 +1,26 @@
+"""add cards.import_id
+
+Revision ID: 9c5d2b7f3a18
+Revises: 3f9b1e6d2c87
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '9c5d2b7f3a18'
+down_revision: Union[str, None] = '3f9b1e6d2c87'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Nullable with no default: a catalog-only change, no table rewrite.
+    op.add_column('cards', sa.Column('import_id', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('cards', 'import_id')
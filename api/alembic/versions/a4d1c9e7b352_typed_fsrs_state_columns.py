@@ -0,0 +1,60 @@
+"""store FSRS state in typed progress columns instead of JSONB
+
+Revision ID: a4d1c9e7b352
+Revises: 8f3b6d2e4a17
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d1c9e7b352'
+down_revision: Union[str, None] = '8f3b6d2e4a17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('progress', sa.Column('fsrs_state', sa.Integer(), nullable=True))
+    op.add_column('progress', sa.Column('fsrs_step', sa.Integer(), nullable=True))
+    op.add_column('progress', sa.Column('stability', sa.Float(), nullable=True))
+    op.add_column('progress', sa.Column('difficulty', sa.Float(), nullable=True))
+    op.add_column('progress', sa.Column('fsrs_last_review', sa.DateTime(timezone=True), nullable=True))
+    # Backfill from the serialized fsrs.Card (Card.to_dict() layout).
+    op.execute("""
+        UPDATE progress SET
+            fsrs_state = (fsrs_card->>'state')::int,
+            fsrs_step = (fsrs_card->>'step')::int,
+            stability = (fsrs_card->>'stability')::double precision,
+            difficulty = (fsrs_card->>'difficulty')::double precision,
+            fsrs_last_review = (fsrs_card->>'last_review')::timestamptz
+        WHERE fsrs_card IS NOT NULL
+    """)
+    op.drop_column('progress', 'fsrs_card')
+    op.create_index('ix_progress_user_stability', 'progress', ['user_id', 'stability'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_progress_user_stability', table_name='progress')
+    op.add_column('progress', sa.Column('fsrs_card', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.execute("""
+        UPDATE progress SET fsrs_card = jsonb_build_object(
+            'card_id', 0,
+            'state', fsrs_state,
+            'step', fsrs_step,
+            'stability', stability,
+            'difficulty', difficulty,
+            'due', due,
+            'last_review', fsrs_last_review
+        )
+        WHERE fsrs_state IS NOT NULL
+    """)
+    op.drop_column('progress', 'fsrs_last_review')
+    op.drop_column('progress', 'difficulty')
+    op.drop_column('progress', 'stability')
+    op.drop_column('progress', 'fsrs_step')
+    op.drop_column('progress', 'fsrs_state')
@@ -0,0 +1,33 @@
+"""add lower_labels() and a GIN index on cards for label filters
+
+Revision ID: c2e8a5f1d6b9
+Revises: a4d1c9e7b352
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2e8a5f1d6b9'
+down_revision: Union[str, None] = 'a4d1c9e7b352'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep in sync with db_models.LOWER_LABELS_FN.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION lower_labels(text[]) RETURNS text[]
+        LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS
+        $$ SELECT coalesce(array_agg(lower(l)), '{}') FROM unnest($1) AS l $$
+    """)
+    op.execute(
+        "CREATE INDEX ix_cards_labels_lower ON cards USING gin (lower_labels(labels))"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_cards_labels_lower', table_name='cards')
+    op.execute("DROP FUNCTION lower_labels(text[])")
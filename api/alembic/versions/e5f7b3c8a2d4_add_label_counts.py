@@ -0,0 +1,40 @@
+"""add label_counts table, backfilled from cards
+
+Revision ID: e5f7b3c8a2d4
+Revises: c2e8a5f1d6b9
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f7b3c8a2d4'
+down_revision: Union[str, None] = 'c2e8a5f1d6b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'label_counts',
+        sa.Column('label', sa.String(), nullable=False),
+        sa.Column('card_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('label'),
+    )
+    # Same counting rule as label_counts._TRUE_COUNTS_SQL.
+    op.execute("""
+        INSERT INTO label_counts (label, card_count)
+        SELECT spelling, count(*) FROM (
+            SELECT DISTINCT ON (c.id, lower(t.l)) t.l AS spelling
+            FROM cards c, unnest(c.labels) WITH ORDINALITY AS t(l, n)
+            ORDER BY c.id, lower(t.l), t.n
+        ) s
+        GROUP BY spelling
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('label_counts')
@@ -0,0 +1,44 @@
+"""add decks.card_count; ensure every card-creator has a My Cards deck
+
+Revision ID: f1a6d4b9c3e8
+Revises: e5f7b3c8a2d4
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a6d4b9c3e8'
+down_revision: Union[str, None] = 'e5f7b3c8a2d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('decks', sa.Column('card_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute("""
+        UPDATE decks SET card_count = c.n
+        FROM (SELECT deck_id, count(*) AS n FROM cards
+              WHERE deck_id IS NOT NULL GROUP BY deck_id) c
+        WHERE decks.id = c.deck_id
+    """)
+    # GET /decks no longer creates "My Cards" on the fly; make sure every
+    # trusted/admin user already has one (and is subscribed to it).
+    op.execute("""
+        WITH created AS (
+            INSERT INTO decks (id, name, owner_id, created_by, created_at, featured, card_count)
+            SELECT gen_random_uuid()::text, 'My Cards', u.id, u.id, now(), false, 0
+            FROM users u
+            WHERE u.roles && ARRAY['trusted', 'admin']::varchar[]
+              AND NOT EXISTS (SELECT 1 FROM decks d WHERE d.owner_id = u.id)
+            RETURNING id, owner_id
+        )
+        INSERT INTO deck_subscriptions (user_id, deck_id, created_at)
+        SELECT owner_id, id, now() FROM created
+    """)
+
+def downgrade() -> None:
+    op.drop_column('decks', 'card_count')
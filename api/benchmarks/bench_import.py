@@ -0,0 +1,58 @@
+"""POST /import/cards throughput at 100k rows.
+
+Rows are staged in a temp table and matched against the deck with one join
+per batch, so an import is a few statements per IMPORT_BATCH_ROWS rows. Three
+passes over the same deck: a fresh load, a re-import where every row is a
+duplicate, and a re-import with changed labels in update_existing mode.
+
+    python -m benchmarks.bench_import [rows]
+"""
+import json
+import sys
+import time
+
+from fastapi import Response
+
+from benchmarks._common import reset_schema, make_user, report
+from database import SessionLocal
+from db_models import Deck
+from models import ImportRequest
+from routes.io import import_cards
+
+
+def main(rows: int = 100_000) -> None:
+    reset_schema()
+    admin_id = make_user(roles=["admin"])
+    payload = {"user_id": admin_id, "authenticated": True, "roles": ["admin"]}
+    db = SessionLocal()
+    try:
+        deck = Deck(name="Bench", created_by=admin_id)
+        db.add(deck)
+        db.commit()
+        deck_id = deck.id
+
+        def content(label):
+            return json.dumps({"cards": [
+                {"front": f"front {i}", "back": f"back {i}", "labels": [label, f"l{i % 50}"]}
+                for i in range(rows)
+            ]})
+
+        results = []
+        for mode, label, update_existing in (("fresh", "a", False),
+                                             ("all duplicates", "a", False),
+                                             ("update labels", "b", True)):
+            req = ImportRequest(format="json", content=content(label), deck_id=deck_id,
+                                update_existing=update_existing)
+            start = time.perf_counter()
+            counts = import_cards(req=req, response=Response(), db=db, payload=payload)
+            elapsed = time.perf_counter() - start
+            results.append((mode, elapsed * 1000, rows / elapsed,
+                            counts["imported"], counts["updated"]))
+    finally:
+        db.close()
+    report(f"/import/cards, {rows} rows", ("mode", "total ms", "rows/s", "imported", "updated"),
+           results)
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
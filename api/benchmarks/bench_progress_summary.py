@@ -0,0 +1,58 @@
+"""GET /my-progress/summary latency at 100k progress rows.
+
+The summary is a single aggregate query (count ... FILTER per bucket), so the
+uncached time is one index scan over the user's progress rows with nothing
+hydrated into Python; the cached time is a Redis GET.
+
+    python -m benchmarks.bench_progress_summary [progress_rows]
+"""
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from benchmarks._common import reset_schema, make_user, bulk_insert, timed, report
+from database import SessionLocal
+from db_models import Card, Progress
+from routes.cards import get_my_progress_summary, invalidate_summary
+
+STATUSES = ("learning", "review", "relearning", "mastered", "difficult")
+
+
+def main(rows: int = 100_000) -> None:
+    reset_schema()
+    user_id = make_user()
+    now = datetime.utcnow()
+    ids = [str(uuid.uuid4()) for _ in range(rows)]
+    bulk_insert(Card, [
+        {"id": cid, "front": f"f{i}", "back": f"b{i}", "labels": [], "created_at": now}
+        for i, cid in enumerate(ids)
+    ])
+    rng = random.Random(0)
+    base = datetime.now(timezone.utc)
+    bulk_insert(Progress, [
+        {"user_id": user_id, "card_id": cid, "notes": "",
+         "status": rng.choice(STATUSES), "review_count": rng.randint(1, 20),
+         "flagged": rng.random() < 0.05,
+         "due": base + timedelta(hours=rng.randint(-240, 240))}
+        for cid in ids
+    ])
+
+    payload = {"user_id": user_id, "authenticated": True, "roles": ["user"]}
+    db = SessionLocal()
+    try:
+        def uncached():
+            invalidate_summary(user_id)
+            get_my_progress_summary(db=db, payload=payload)
+
+        cold = timed(uncached)
+        get_my_progress_summary(db=db, payload=payload)
+        warm = timed(lambda: get_my_progress_summary(db=db, payload=payload))
+    finally:
+        db.close()
+    report(f"/my-progress/summary, {rows} progress rows", ("mode", "median ms", "p95 ms"),
+           [("aggregate", *cold), ("cached", *warm)])
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
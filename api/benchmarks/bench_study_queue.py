@@ -0,0 +1,72 @@
+"""GET /study/queue latency as the caller's tracked-card count grows.
+
+New-card selection is a NOT EXISTS anti-join against `progress`, so latency
+should stay roughly flat as the user reviews more of the library (the old
+`NOT IN (<every tracked id>)` form grew with the tracked count). The "cold"
+columns time that materializing query (routes.study._materialize_queue)
+directly, since GET /study/queue is otherwise served from the Redis queue
+cache after its first call. That query also reads every tracked card's due
+date for the cache to order, which does grow with the tracked count, so
+expect a slow linear rise rather than a flat line. The "cached" columns time
+the full route on a warm cache, for comparison.
+
+    python -m benchmarks.bench_study_queue [total_cards]
+"""
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from benchmarks._common import reset_schema, make_user, bulk_insert, timed, report
+from database import SessionLocal
+from db_models import Card, Progress
+from routes.study import _materialize_queue, study_queue
+from study_cache import queue_cache
+
+STEPS = (0, 1_000, 5_000, 10_000, 30_000)
+
+
+def main(total_cards: int = 50_000) -> None:
+    reset_schema()
+    user_id = make_user()
+    now = datetime.utcnow()
+    ids = [str(uuid.uuid4()) for _ in range(total_cards)]
+    bulk_insert(Card, [
+        {"id": cid, "front": f"f{i}", "back": f"b{i}", "labels": [], "created_at": now}
+        for i, cid in enumerate(ids)
+    ])
+
+    payload = {"user_id": user_id, "authenticated": True, "roles": ["user"]}
+    # Everything tracked is scheduled well in the future, so the due half of the
+    # queue stays empty and we time new-card selection alone.
+    later = datetime.now(timezone.utc) + timedelta(days=30)
+    tracked = 0
+    results = []
+    for step in STEPS:
+        bulk_insert(Progress, [
+            {"user_id": user_id, "card_id": cid, "status": "review", "due": later,
+             "notes": "", "review_count": 1}
+            for cid in ids[tracked:step]
+        ])
+        tracked = step
+        db = SessionLocal()
+        try:
+            cold = timed(lambda: _materialize_queue(db, user_id, None, None, 20))
+
+            def cached():
+                return study_queue(limit=20, deck_id=None, deck_ids=None, labels=None,
+                                   db=db, payload=payload)
+
+            # bulk_insert bypasses the cache upkeep, so rebuild it for this step.
+            queue_cache.drop_user(user_id)
+            cached()
+            warm = timed(cached)
+        finally:
+            db.close()
+        results.append((step, *cold, *warm))
+
+    report(f"/study/queue, {total_cards} cards",
+           ("tracked", "cold med ms", "cold p95 ms", "cached med", "cached p95"), results)
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
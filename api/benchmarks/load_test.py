@@ -0,0 +1,163 @@
+"""Throughput and latency of the hot routes under concurrent load, to compare
+the sync stack with the async one (ASYNC_DB=1) on the same data.
+
+Seeds users, decks and cards straight into the database, then drives one or
+more *running* API servers over HTTP: `concurrency` clients, each logged in
+as its own user, loop over the hot routes for `duration` seconds. Start one
+server per mode against the same database and Redis, e.g.
+
+    uvicorn main:app --port 8000                 # sync
+    ASYNC_DB=1 uvicorn main:app --port 8001      # async
+    python -m benchmarks.load_test sync=http://localhost:8000 async=http://localhost:8001
+
+Optional flags: --concurrency N (default 64, more than the 40-thread sync
+pool), --duration SECONDS (default 20), --review to add POST
+/cards/{id}/review to the mix. Reviews are rate limited (120/min per user),
+so with --review expect some 429s; they're counted as `limited`, not as
+errors, and left out of the latency figures.
+
+Clients log in a few at a time (retrying on 503) before the clock starts, and
+each sends its own X-Forwarded-For so the per-IP login and review limits
+don't lump them together. Truncates every table, like the other
+benchmarks.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+
+from benchmarks._common import reset_schema, bulk_insert, report
+from db_models import Card, Deck, User
+from jwt_utils import hash_password
+
+PASSWORD = "loadtest-pw-123"
+DECKS = 20
+CARDS_PER_DECK = 500
+# Logins in flight at once while clients sign in (bcrypt is slow and its
+# pool sheds with 503 beyond PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE).
+LOGIN_CONCURRENCY = 8
+LOGIN_ATTEMPTS = 10
+
+
+def seed(users: int) -> list:
+    """Create `users` users plus public decks and cards; returns the emails."""
+    reset_schema()
+    now = datetime.utcnow()
+    hashed = hash_password(PASSWORD)  # one bcrypt for everyone
+    emails = [f"load{i}@test.com" for i in range(users)]
+    bulk_insert(User, [
+        {"id": str(uuid.uuid4()), "email": e, "hashed_password": hashed,
+         "roles": ["user"], "is_active": True, "created_at": now}
+        for e in emails
+    ])
+    deck_ids = [str(uuid.uuid4()) for _ in range(DECKS)]
+    bulk_insert(Deck, [
+        {"id": d, "name": f"Deck {i}", "description": "", "card_count": CARDS_PER_DECK,
+         "created_at": now}
+        for i, d in enumerate(deck_ids)
+    ])
+    bulk_insert(Card, [
+        {"id": str(uuid.uuid4()), "front": f"f{d[:8]}-{i}", "back": f"b{i}",
+         "labels": [f"l{i % 10}"], "deck_id": d, "created_at": now}
+        for d in deck_ids for i in range(CARDS_PER_DECK)
+    ])
+    return emails
+
+
+async def _login(c: httpx.AsyncClient, email: str, gate: asyncio.Semaphore) -> None:
+    """Log one client in, a few at a time: a login storm would overflow the
+    bcrypt pool and get 503s. Honors Retry-After on 503/429."""
+    async with gate:
+        for _ in range(LOGIN_ATTEMPTS):
+            resp = await c.post("/auth/login", json={"email": email, "password": PASSWORD})
+            if resp.status_code not in (429, 503):
+                resp.raise_for_status()
+                return
+            await asyncio.sleep(float(resp.headers.get("Retry-After", "1")))
+    raise RuntimeError(f"{email}: login still throttled after {LOGIN_ATTEMPTS} attempts")
+
+
+async def _drive(c: httpx.AsyncClient, deadline: float, review: bool, stats: dict) -> None:
+    calls = [("GET /study/queue", "GET", "/study/queue", None),
+             ("GET /cards", "GET", "/cards?limit=50", None),
+             ("GET /decks", "GET", "/decks", None)]
+    card_ids = []
+    while time.monotonic() < deadline:
+        for name, method, path, body in calls:
+            if time.monotonic() >= deadline:
+                break
+            start = time.perf_counter()
+            try:
+                resp = await c.request(method, path, json=body)
+            except httpx.HTTPError:
+                stats[name]["errors"] += 1
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            if resp.status_code == 429:
+                stats[name]["limited"] += 1
+            elif resp.status_code >= 400:
+                stats[name]["errors"] += 1
+            else:
+                stats[name]["ms"].append(elapsed)
+                if name == "GET /study/queue":
+                    card_ids = [q["card_id"] for q in resp.json()["queue"]] or card_ids
+        if review and card_ids:
+            calls = calls[:3] + [("POST /cards/{id}/review", "POST",
+                                  f"/cards/{random.choice(card_ids)}/review",
+                                  {"rating": random.choice(["hard", "good", "easy"])})]
+
+
+async def run(base_url: str, emails: list, duration: float, review: bool) -> dict:
+    """Log every client in, then drive them all for `duration` seconds."""
+    names = ["GET /study/queue", "GET /cards", "GET /decks", "POST /cards/{id}/review"]
+    stats = {n: {"ms": [], "errors": 0, "limited": 0} for n in names}
+    # Own X-Forwarded-For per client, so per-IP limits don't lump them together.
+    clients = [
+        httpx.AsyncClient(base_url=base_url, timeout=30, headers={
+            "X-Forwarded-For": f"10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}"})
+        for n in range(len(emails))
+    ]
+    try:
+        gate = asyncio.Semaphore(LOGIN_CONCURRENCY)
+        await asyncio.gather(*(_login(c, e, gate) for c, e in zip(clients, emails)))
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(_drive(c, deadline, review, stats) for c in clients))
+    finally:
+        await asyncio.gather(*(c.aclose() for c in clients))
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("targets", nargs="+", help="name=url of a running API server")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--review", action="store_true")
+    args = parser.parse_args()
+
+    emails = seed(args.concurrency)
+    rows = []
+    for target in args.targets:
+        label, _, url = target.partition("=")
+        stats = asyncio.run(run(url or label, emails, args.duration, args.review))
+        for name, s in stats.items():
+            ms = sorted(s["ms"])
+            if not ms and not s["errors"] and not s["limited"]:
+                continue
+            rows.append((
+                label, name, len(ms) / args.duration,
+                statistics.median(ms) if ms else 0.0,
+                ms[max(0, int(len(ms) * 0.95) - 1)] if ms else 0.0,
+                s["errors"], s["limited"],
+            ))
+    report(f"hot routes, {args.concurrency} concurrent clients, {args.duration:g}s per target",
+           ["target", "route", "req/s", "p50 ms", "p95 ms", "errors", "limited"], rows)
+
+
+if __name__ == "__main__":
+    main()
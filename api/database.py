@@ -1,25 +1,83 @@
 """SQLAlchemy engine, session factory, and FastAPI dependency.
 
-Postgres is the primary datastore for users, cards, and progress.
+Postgres is the primary datastore for users, cards, and progress. With
+ASYNC_DB on, an asyncpg engine and get_async_db serve the async hot routes
+(routes/hot_async.py) alongside the sync engine everything else uses. With
+DATABASE_READ_URL set, read_engine / ReadSessionLocal point at a read
+replica (used through read_routing.get_read_db); otherwise they are simply
+the primary's.
+
+Pool sizing, recycling, pre-ping and the statement timeout come from
+config.py; db_metrics.py counts checkout waits and slow statements.
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-from config import DATABASE_URL
+from config import (
+    ASYNC_DB, ASYNC_DATABASE_URL, DATABASE_READ_URL, DATABASE_URL, DB_MAX_OVERFLOW, DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE_SECONDS, DB_POOL_SIZE, DB_POOL_TIMEOUT_SECONDS, DB_STATEMENT_TIMEOUT_MS,
+)
+import db_metrics
+
+_POOL_ARGS = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+    pool_recycle=DB_POOL_RECYCLE_SECONDS,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
 
 # Force the client connection to UTF-8. Without this, a database created with
 # SQL_ASCII encoding makes psycopg2 use the ASCII codec, which raises
 # UnicodeEncodeError on any non-ASCII text (em-dashes, smart quotes, accents,
 # emoji). UTF-8 stores those losslessly even against a SQL_ASCII database.
+# statement_timeout is set per connection at startup, so it needs no extra
+# round trip (a pooler in transaction mode may reject startup options; set
+# DB_STATEMENT_TIMEOUT_MS=0 and configure it on the role instead).
+_connect_args = {"client_encoding": "utf8"}
+if DB_STATEMENT_TIMEOUT_MS:
+    _connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
 engine = create_engine(
     DATABASE_URL,
-    pool_pre_ping=True,
     future=True,
-    connect_args={"client_encoding": "utf8"},
+    poolclass=db_metrics.TimedQueuePool,
+    connect_args=_connect_args,
+    **_POOL_ARGS,
 )
+db_metrics.instrument("primary", engine)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
 Base = declarative_base()
 
+# Sessions for batch jobs (import_worker.py, label_counts.py reconcile), whose
+# statements may legitimately outrun DB_STATEMENT_TIMEOUT_MS. Each transaction
+# lifts the timeout with SET LOCAL, which ends with the transaction, so the
+# pooled connection goes back with the default intact.
+BatchSessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+
+
+@event.listens_for(BatchSessionLocal, "after_begin")
+def _lift_statement_timeout(session, transaction, connection):
+    if DB_STATEMENT_TIMEOUT_MS:
+        connection.exec_driver_sql("SET LOCAL statement_timeout = 0")
+
+read_engine = engine
+ReadSessionLocal = SessionLocal
+if DATABASE_READ_URL:
+    # Read-only at the session level too, so a write routed here by mistake
+    # fails loudly even when both URLs reach the same server.
+    _read_options = " ".join(filter(None, [_connect_args.get("options"),
+                                           "-c default_transaction_read_only=on"]))
+    read_engine = create_engine(
+        DATABASE_READ_URL,
+        future=True,
+        poolclass=db_metrics.TimedQueuePool,
+        connect_args={**_connect_args, "options": _read_options},
+        **_POOL_ARGS,
+    )
+    db_metrics.instrument("replica", read_engine)
+    ReadSessionLocal = sessionmaker(bind=read_engine, autocommit=False, autoflush=False,
+                                    future=True)
+
 
 def get_db():
     """Yield a request-scoped database session (FastAPI dependency)."""
@@ -28,3 +86,40 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Only built when enabled, so sync-only deployments never import asyncpg.
+# asyncpg always talks UTF-8, so it needs no client_encoding override.
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        poolclass=db_metrics.TimedAsyncQueuePool,
+        connect_args={"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        if DB_STATEMENT_TIMEOUT_MS else {},
+        **_POOL_ARGS,
+    )
+    db_metrics.instrument("async", async_engine.sync_engine)
+    # expire_on_commit=False: attributes read after commit would otherwise
+    # need an implicit (and, under asyncio, illegal) lazy reload.
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db():
+    """Yield a request-scoped AsyncSession (FastAPI dependency; ASYNC_DB only)."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def dispose_engines() -> None:
+    """Forget pooled connections inherited from a parent process. Call in each
+    worker after fork (gunicorn.conf.py): close=False drops them without
+    closing the sockets the parent may still be using."""
+    engine.dispose(close=False)
+    if read_engine is not engine:
+        read_engine.dispose(close=False)
+    if async_engine is not None:
+        async_engine.sync_engine.dispose(close=False)
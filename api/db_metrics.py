@@ -0,0 +1,155 @@
+"""Connection-pool and query counters for the SQLAlchemy engines.
+
+database.py builds its engines on the Timed* pool classes here and calls
+instrument() on each, so every checkout records how long it waited for a
+connection (and whether it timed out), and every statement is timed against
+DB_SLOW_QUERY_MS. db_stats() reports them, together with live pool usage,
+for GET /admin/metrics. Figures are per process, like the other counters
+there: multiply by the number of API workers when sizing against Postgres
+max_connections.
+"""
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from config import DB_SLOW_QUERY_MS
+
+# Waits shorter than this count as an immediate checkout, not a wait.
+_WAIT_THRESHOLD_MS = 1.0
+# Recent slow statements kept for the metrics payload (text truncated).
+_RECENT_SLOW = 10
+_QUERY_CANCELED = "57014"  # SQLSTATE for statement_timeout
+
+_engines = {}  # name -> EngineStats
+
+
+class EngineStats:
+    def __init__(self, name: str, engine):
+        self.name = name
+        self.engine = engine
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waited = 0
+        self.timeouts = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.peak_checked_out = 0
+        self.queries = 0
+        self.slow_queries = 0
+        self.statement_timeouts = 0
+        self.recent_slow = deque(maxlen=_RECENT_SLOW)
+
+    def checkout(self, wait_ms: float, checked_out: int) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+            if wait_ms >= _WAIT_THRESHOLD_MS:
+                self.waited += 1
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def query(self, ms: float, statement: str) -> None:
+        with self._lock:
+            self.queries += 1
+            if ms >= DB_SLOW_QUERY_MS:
+                self.slow_queries += 1
+                self.recent_slow.append({"ms": round(ms, 1), "statement": statement[:200]})
+
+    def canceled(self) -> None:
+        with self._lock:
+            self.statement_timeouts += 1
+
+    def snapshot(self) -> dict:
+        pool = self.engine.pool
+        size, overflow = pool.size(), getattr(pool, "_max_overflow", 0)
+        capacity = size + overflow if overflow >= 0 else None
+        checked_out = pool.checkedout()
+        with self._lock:
+            return {
+                "pool_size": size,
+                "max_overflow": overflow,
+                "checked_out": checked_out,
+                "peak_checked_out": self.peak_checked_out,
+                # Share of the pool in use right now; 1.0 means the next
+                # checkout waits.
+                "saturation": round(checked_out / capacity, 3) if capacity else None,
+                "checkouts": self.checkouts,
+                "checkouts_waited": self.waited,
+                "checkout_timeouts": self.timeouts,
+                "wait_ms_avg": round(self.wait_ms_total / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_ms_max": round(self.wait_ms_max, 3),
+                "queries": self.queries,
+                "slow_queries": self.slow_queries,
+                "slow_query_ms": DB_SLOW_QUERY_MS,
+                "statement_timeouts": self.statement_timeouts,
+                "recent_slow": list(self.recent_slow),
+            }
+
+
+class _TimedPoolMixin:
+    """Times how long each checkout waits for a free connection."""
+    _stats = None  # set by instrument(); carried across recreate()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeout:
+            if self._stats:
+                self._stats.timeout()
+            raise
+        if self._stats:
+            self._stats.checkout((time.perf_counter() - start) * 1000, self.checkedout())
+        return conn
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool built by recreate().
+        pool = super().recreate()
+        pool._stats = self._stats
+        return pool
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument(name: str, engine) -> None:
+    """Attach counters to an engine (sync, or an AsyncEngine's sync_engine)."""
+    stats = EngineStats(name, engine)
+    _engines[name] = stats
+    if isinstance(engine.pool, _TimedPoolMixin):
+        engine.pool._stats = stats
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        stats.query((time.perf_counter() - started) * 1000, statement)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        if ctx.connection is not None and ctx.connection.info.get("query_start"):
+            ctx.connection.info["query_start"].pop()
+        orig = ctx.original_exception
+        if (getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)) == _QUERY_CANCELED:
+            stats.canceled()
+
+
+def db_stats() -> dict:
+    """Pool and query counters for every instrumented engine, by name."""
+    return {name: stats.snapshot() for name, stats in _engines.items()}
@@ -4,13 +4,16 @@ UUID primary keys are stored as strings to match the app's existing uuid4
 identifiers and keep things portable. Labels are stored as a Postgres text
 array on the card (global, free-form strings), matching the prior design.
 """
+import hashlib
+import unicodedata
 import uuid
 from datetime import datetime
 
 from sqlalchemy import (
-    Column, String, Text, Integer, Boolean, DateTime, ForeignKey, Index, text,
+    Column, String, Text, Integer, Float, Boolean, DateTime, ForeignKey, Index, text,
+    DDL, event, func,
 )
-from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
 
 from database import Base
@@ -20,6 +23,38 @@ def _uuid() -> str:
     return str(uuid.uuid4())
 
 
+# Lower-cased copy of a label array. Declared IMMUTABLE so it can back the GIN
+# expression index on cards, which makes case-insensitive label filters an
+# index lookup. Created ahead of the cards table (see the DDL hook below) and by
+# migration for existing databases.
+LOWER_LABELS_FN = DDL("""
+CREATE OR REPLACE FUNCTION lower_labels(text[]) RETURNS text[]
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS
+$$ SELECT coalesce(array_agg(lower(l)), '{}') FROM unnest($1) AS l $$
+""")
+
+
+def lower_labels(labels):
+    """SQL expression: lower_labels(<labels>), typed as a text array so
+    `.contains()` / `.overlap()` render as @> / &&."""
+    return func.lower_labels(labels, type_=ARRAY(Text))
+
+
+def content_hash(front: str, back: str) -> str:
+    """Dedup key for a card's content: each side NFC-normalized, casefolded and
+    trimmed, then hashed together. Cards in one deck with the same hash are
+    duplicates for import and for the duplicates report."""
+    def norm(s):
+        return unicodedata.normalize("NFC", s or "").casefold().strip()
+    return hashlib.sha1(f"{norm(front)}\x1f{norm(back)}".encode()).hexdigest()
+
+
+def _content_hash_default(context) -> str:
+    # Column default, so plain Core INSERTs (bulk loads, benchmarks) get it too.
+    params = context.get_current_parameters()
+    return content_hash(params.get("front"), params.get("back"))
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -62,6 +97,9 @@ class Deck(Base):
     )
     created_by = Column(String, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Denormalized count of cards filed here, kept current by every path that
+    # files, moves or deletes cards (routes/cards.py _adjust_deck_counts).
+    card_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     cards = relationship("Card", back_populates="deck")
 
@@ -83,6 +121,14 @@ class DeckSubscription(Base):
 
 class Card(Base):
     __tablename__ = "cards"
+    __table_args__ = (
+        # Serves keyset pagination of GET /cards in (created_at, id) order.
+        Index("ix_cards_created_at_id", "created_at", "id"),
+        # Serves label filters (routes/cards.py label_match).
+        Index("ix_cards_labels_lower", text("lower_labels(labels)"), postgresql_using="gin"),
+        # Serves import dedup and GET /decks/{id}/duplicates.
+        Index("ix_cards_deck_content_hash", "deck_id", "content_hash"),
+    )
 
     id = Column(String, primary_key=True, default=_uuid)
     front = Column(Text, nullable=False)
@@ -97,6 +143,11 @@ class Card(Base):
     )
     created_by = Column(String, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # content_hash(front, back); set on insert and kept current on edit below.
+    content_hash = Column(String(40), nullable=False, default=_content_hash_default)
+    # The import (importer.ImportState.import_id; a job's id for background
+    # imports) that created this card; NULL for cards made any other way.
+    import_id = Column(String, nullable=True)
 
     creator = relationship("User", back_populates="cards", foreign_keys=[created_by])
     deck = relationship("Deck", back_populates="cards")
@@ -105,8 +156,24 @@ class Card(Base):
     )
 
 
+event.listen(Card.__table__, "before_create", LOWER_LABELS_FN)
+
+
+def _refresh_content_hash(mapper, connection, card) -> None:
+    card.content_hash = content_hash(card.front, card.back)
+
+
+event.listen(Card, "before_update", _refresh_content_hash)
+
+
 class Progress(Base):
     __tablename__ = "progress"
+    __table_args__ = (
+        Index("ix_progress_user_stability", "user_id", "stability"),
+        # Serves per-user "due now" counts and queue scans.
+        Index("ix_progress_user_due", "user_id", "due",
+              postgresql_where=text("due IS NOT NULL")),
+    )
 
     # Composite primary key: one progress row per (user, card).
     user_id = Column(
@@ -122,15 +189,83 @@ class Progress(Base):
     # User-set star/flag, independent of FSRS status (never auto-overwritten).
     flagged = Column(Boolean, nullable=False, default=False, server_default="false")
 
-    # FSRS scheduling state. `due` is denormalized out of `fsrs_card` for fast
-    # "what's due now" queries; `fsrs_card` is the serialized FSRS Card.
+    # FSRS scheduling state, one typed column per field (see
+    # scheduler.STATE_FIELDS). All NULL until the card's first review.
     due = Column(DateTime(timezone=True), nullable=True, index=True)
-    fsrs_card = Column(JSONB, nullable=True)
+    fsrs_state = Column(Integer, nullable=True)   # fsrs.State value
+    fsrs_step = Column(Integer, nullable=True)
+    stability = Column(Float, nullable=True)
+    difficulty = Column(Float, nullable=True)
+    fsrs_last_review = Column(DateTime(timezone=True), nullable=True)
 
     user = relationship("User", back_populates="progress")
     card = relationship("Card", back_populates="progress")
 
 
+class ReviewReceipt(Base):
+    """Outcome of one event accepted by the batch review endpoint, keyed by the
+    client's idempotency key. A retried batch finds its already-applied events
+    here and gets the original result back instead of reviewing twice."""
+    __tablename__ = "review_receipts"
+
+    user_id = Column(
+        String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    idempotency_key = Column(String, primary_key=True)
+    card_id = Column(String, ForeignKey("cards.id", ondelete="CASCADE"), nullable=False)
+    rating = Column(String, nullable=False)
+    reviewed_at = Column(DateTime(timezone=True), nullable=False)
+    due = Column(DateTime(timezone=True), nullable=False)
+    status = Column(String, nullable=False)
+    review_count = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class LabelCount(Base):
+    """How many cards carry each label, kept current by the card write paths
+    (see label_counts.py) so GET /labels never scans cards. A card counts once
+    per label regardless of letter case, under the first spelling it uses."""
+    __tablename__ = "label_counts"
+
+    label = Column(String, primary_key=True)
+    card_count = Column(Integer, nullable=False, default=0)
+
+
+class ImportJob(Base):
+    """A background card import (POST /import/cards with background=true), run
+    by import_worker.py. The file text is kept until the job finishes; the
+    counters are committed with each batch, so GET /import/jobs/{id} shows
+    progress while it runs."""
+    __tablename__ = "import_jobs"
+    __table_args__ = (
+        # Serves the worker's "oldest claimable job" lookup.
+        Index("ix_import_jobs_status_created_at", "status", "created_at"),
+    )
+
+    id = Column(String, primary_key=True, default=_uuid)
+    created_by = Column(String, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    # Not a foreign key: the worker re-checks the deck when it starts, and a
+    # deck deleted in between fails the job rather than importing unfiled.
+    deck_id = Column(String, nullable=True)
+    format = Column(String, nullable=False)
+    content = Column(Text, nullable=True)         # cleared once the job ends
+    update_existing = Column(Boolean, nullable=False, default=False)
+    # queued -> running -> done | failed
+    status = Column(String, nullable=False, default="queued", server_default="queued")
+    rows_total = Column(Integer, nullable=True)
+    rows_parsed = Column(Integer, nullable=False, default=0)
+    imported = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    # Bumped by every committed batch; a running job whose heartbeat goes stale
+    # (worker died) is picked up again and resumes after rows_parsed.
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
 class CardProposal(Base):
     """A user-proposed change to a card's content, reviewed by an admin.
     Stored separately so it never mutates the card until accepted."""
@@ -9,4 +9,33 @@ if [ -n "$ADMIN_EMAIL" ] && [ -n "$ADMIN_PASSWORD" ]; then
   python seed_admin.py || echo "seed_admin: skipped (continuing)"
 fi
 
-exec uvicorn main:app --host 0.0.0.0 --port 8000
+# Background import worker (POST /import/cards with background=true). Set
+# IMPORT_WORKER=0 to run it as a separate process/container instead.
+worker_pid=
+if [ "${IMPORT_WORKER:-1}" = "1" ]; then
+  python import_worker.py &
+  worker_pid=$!
+fi
+
+# Uvicorn workers under gunicorn, one per usable CPU up to 4 (WEB_CONCURRENCY
+# to override); see gunicorn.conf.py for preload, post-fork pool reset and
+# graceful drain.
+gunicorn main:app -c gunicorn.conf.py &
+server_pid=$!
+
+# This shell stays PID 1, so it forwards SIGTERM/SIGINT to both children:
+# gunicorn drains its requests and the import worker requeues its job after
+# the current batch, instead of being SIGKILLed and left for the stale-job
+# reclaim.
+stop() {
+  kill -TERM "$server_pid" $worker_pid 2>/dev/null || true
+}
+trap stop TERM INT
+
+status=0
+wait "$server_pid" || status=$?
+# Interrupted by a signal, or the server exited on its own: stop whatever is
+# still running, then reap both.
+stop
+wait
+exit "$status"
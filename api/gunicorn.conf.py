@@ -0,0 +1,48 @@
+"""Gunicorn settings for the production API server (see entrypoint.sh).
+
+Gunicorn supervises WEB_CONCURRENCY Uvicorn workers. Without it, one per CPU
+this process may run on, capped at DEFAULT_MAX_WORKERS: cpu_count() reports
+the host's cores, not the container's share, and every worker opens its own
+connection pools. Set WEB_CONCURRENCY explicitly when the container has a
+CPU quota (--cpus / cpu limits), which the affinity mask doesn't see.
+
+Workers matter because bcrypt and JSON serialization are CPU-bound and a
+single process only ever uses one core. The app is imported once in the
+master (preload_app) and then forked. post_fork gives every worker fresh
+connection pools, since a pooled connection must never be shared across
+processes.
+
+On SIGTERM gunicorn stops accepting connections, lets in-flight requests
+finish for up to GRACEFUL_TIMEOUT seconds, then exits.
+
+    gunicorn main:app -c gunicorn.conf.py
+"""
+import os
+
+DEFAULT_MAX_WORKERS = 4
+
+
+def _usable_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):  # Linux: honours cpusets / taskset
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY") or min(_usable_cpus(), DEFAULT_MAX_WORKERS))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+# Seconds a worker may spend draining on shutdown / restart, and the silence
+# after which a stuck worker is killed and replaced.
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = 5
+
+# Uvicorn logs each request itself; gunicorn's own log goes to stderr.
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    import database
+    database.dispose_engines()
@@ -0,0 +1,153 @@
+"""Background runner for queued card imports.
+
+POST /import/cards with `background: true` stores the file in `import_jobs`
+and returns straight away; this process claims queued jobs oldest-first
+(SELECT ... FOR UPDATE SKIP LOCKED, so several workers can share the queue)
+and feeds them to importer.import_batch, committing each batch together with
+the job's counters. On SIGTERM the worker requeues its job after the
+current batch and exits; a job whose worker died mid-run is reclaimed once
+its heartbeat goes stale. Either way it resumes after the last committed
+batch.
+
+Started alongside the API by entrypoint.sh; can also be run by hand:
+
+    python import_worker.py
+"""
+import json
+import signal
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from database import BatchSessionLocal
+from db_models import Deck, ImportJob
+from importer import IMPORT_BATCH_ROWS, ImportState, _parse_content, import_batch
+
+# Idle wait between looks at an empty queue.
+POLL_SECONDS = 2.0
+# A running job with no committed batch for this long is assumed orphaned.
+STALE_AFTER = timedelta(minutes=5)
+
+_stopping = False
+
+
+def _claim(db: Session) -> Optional[ImportJob]:
+    now = datetime.utcnow()
+    job = db.scalar(
+        select(ImportJob)
+        .where(or_(ImportJob.status == "queued",
+                   and_(ImportJob.status == "running",
+                        ImportJob.heartbeat_at < now - STALE_AFTER)))
+        .order_by(ImportJob.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    if job is None:
+        db.rollback()
+        return None
+    job.status = "running"
+    job.started_at = job.started_at or now
+    job.heartbeat_at = now
+    db.commit()
+    return job
+
+
+def _set(db: Session, job_id: str, **values) -> None:
+    db.execute(update(ImportJob).where(ImportJob.id == job_id).values(**values))
+    db.commit()
+
+
+def _finish(db: Session, job_id: str, error: Optional[str] = None) -> None:
+    _set(db, job_id, status="failed" if error else "done", error=error,
+         content=None, finished_at=datetime.utcnow())
+
+
+def run_job(db: Session, job: ImportJob) -> None:
+    # Copy what we need off the ORM object once: it expires at every commit,
+    # and re-reading it would reload the whole file each batch.
+    job_id, fmt, content = job.id, job.format, job.content
+    state = ImportState(job.deck_id, job.created_by, job.update_existing,
+                        started_at=job.started_at, import_id=job_id)
+    state.imported, state.skipped, state.updated = job.imported, job.skipped, job.updated
+    state.rows = job.rows_parsed
+
+    if job.deck_id and db.get(Deck, job.deck_id) is None:
+        _finish(db, job_id, "Deck not found")
+        return
+    try:
+        items = _parse_content(fmt, content or "")
+    except (ValueError, json.JSONDecodeError) as e:
+        _finish(db, job_id, f"Could not parse {fmt}: {e}")
+        return
+    del content  # the parsed rows are all we need from here on
+    _set(db, job_id, rows_total=len(items))
+
+    for start in range(state.rows, len(items), IMPORT_BATCH_ROWS):
+        try:
+            import_batch(db, items[start:start + IMPORT_BATCH_ROWS], state)
+            state.apply_counts(db)
+            db.execute(update(ImportJob).where(ImportJob.id == job_id).values(
+                rows_parsed=state.rows, heartbeat_at=datetime.utcnow(), **state.report(),
+            ))
+            db.commit()
+        except (SQLAlchemyError, UnicodeError):
+            db.rollback()
+            _finish(db, job_id, f"Import failed while saving rows from {start + 1}. "
+                                "The file may contain characters the database can't store.")
+            return
+        state.publish()
+        if _stopping and start + IMPORT_BATCH_ROWS < len(items):
+            # Shutting down: everything so far is committed, so hand the rest
+            # straight back to the queue rather than waiting for the reclaim.
+            _set(db, job_id, status="queued")
+            return
+    _finish(db, job_id)
+
+
+def run_once() -> bool:
+    """Claim and run one job; False when the queue is empty."""
+    db = BatchSessionLocal()
+    try:
+        job = _claim(db)
+        if job is None:
+            return False
+        job_id = job.id
+        try:
+            run_job(db, job)
+        except Exception as e:
+            # Anything unexpected (e.g. a JSON item that isn't an object) fails
+            # the job rather than leaving it to be reclaimed and retried forever.
+            db.rollback()
+            _finish(db, job_id, f"Import failed: {e}")
+        return True
+    finally:
+        db.close()
+
+
+def _stop(signum, frame) -> None:
+    global _stopping
+    _stopping = True
+
+
+def main() -> int:
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    print("import worker: waiting for jobs")
+    while not _stopping:
+        try:
+            busy = run_once()
+        except SQLAlchemyError as e:
+            print(f"import worker: database error, retrying: {e}")
+            busy = False
+        if not busy:
+            time.sleep(POLL_SECONDS)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""Bulk card import: parsing, cleaning and set-based loading.
+
+Rows are parsed and cleaned in Python, then loaded a batch at a time into a
+temporary table with multi-row INSERTs. Matching against the cards already in
+the target deck is a single join, and new cards go in with a single
+INSERT ... SELECT, so an import costs a handful of statements per batch rather
+than one INSERT per row through the ORM unit of work.
+
+Dedup rules: rows are keyed on Card.content_hash (trimmed, NFC-normalized,
+casefolded front and back), which is indexed per deck. A row whose key
+already exists in the deck refreshes that card's labels when
+`update_existing` is set (and is skipped otherwise); repeats of a row the
+same file imported are skipped — recognized by Card.import_id, which every
+card an import creates carries.
+
+Parsing is incremental too (`_iter_content`): rows are pulled from an iterator
+of text lines, so a streamed upload never has to sit in memory whole.
+
+Label and deck counters are not touched per batch: ImportState sums their
+deltas and the caller applies them with `apply_counts()` right before it
+commits, so the counter rows (which every card write touching those labels or
+that deck also updates) stay locked for one statement, not the whole import.
+"""
+import csv
+import io
+import json
+import re
+import unicodedata
+import uuid
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
+from collections import Counter
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, Text, and_, insert, select, text, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+
+from db_models import Card, Deck, content_hash
+from study_cache import queue_cache, MAX_INCREMENTAL_CARDS
+import label_counts
+
+# Rows per temp-table load; the import endpoints hand over this many at a time.
+IMPORT_BATCH_ROWS = 5000
+
+# Labels are multi-valued; join with "|" inside a single CSV cell to avoid
+# colliding with the field comma.
+LABELS_SEP = "|"
+
+# Control characters (minus tab/newline/CR) and the Unicode replacement char,
+# which is what shows up when a file was previously mis-decoded. We replace these
+# with spaces rather than reject the whole import.
+_GARBAGE_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f�]")
+
+# Per-transaction staging table. ON COMMIT DROP keeps it from outliving the
+# import; within one transaction it is truncated between batches.
+_import_rows = Table(
+    "import_rows", MetaData(),
+    Column("ord", Integer),
+    Column("id", String),
+    Column("front", Text),
+    Column("back", Text),
+    Column("labels", ARRAY(String)),
+    Column("content_hash", String),
+)
+_CREATE_IMPORT_ROWS = text(
+    "CREATE TEMPORARY TABLE IF NOT EXISTS import_rows "
+    "(ord integer, id varchar, front text, back text, labels varchar[], content_hash varchar) "
+    "ON COMMIT DROP"
+)
+_INSERT_NEW_CARDS = text("""
+    INSERT INTO cards (id, front, back, labels, content_hash, deck_id, owner_id, created_by,
+                       created_at, import_id)
+    SELECT id, front, back, labels, content_hash, :deck_id, NULL, :user_id,
+           :created_at + ord * interval '1 microsecond', :import_id
+    FROM import_rows
+    WHERE ord = ANY(CAST(:ords AS integer[]))
+""")
+
+
+def _clean_text(s: str) -> str:
+    """Make imported text safe to store: normalize and replace garbage chars
+    with spaces. Legitimate Unicode (em-dashes, accents, emoji) is preserved."""
+    if not s:
+        return s
+    s = unicodedata.normalize("NFC", s)
+    return _GARBAGE_RE.sub(" ", s)
+
+
+def _normalize_labels(value) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    # string form: split on the labels separator (and tolerate commas)
+    parts = str(value).replace(",", LABELS_SEP).split(LABELS_SEP)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _parse_content(fmt: str, content: str) -> List[dict]:
+    fmt = fmt.lower()
+    if fmt == "json":
+        data = json.loads(content)
+        items = data.get("cards", data) if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            raise ValueError("JSON must be a list of cards or {\"cards\": [...]}")
+        return items
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(content))
+        if not reader.fieldnames or "front" not in reader.fieldnames or "back" not in reader.fieldnames:
+            raise ValueError("CSV must have a header row with at least 'front' and 'back'")
+        return list(reader)
+    raise ValueError("format must be 'csv' or 'json'")
+
+
+def _iter_content(fmt: str, lines: Iterable[str]) -> Iterator[dict]:
+    """Rows of a CSV or NDJSON file, parsed lazily from its lines (which keep
+    their line endings, as csv.reader expects). Raises ValueError on a bad
+    header or line."""
+    fmt = fmt.lower()
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        if not reader.fieldnames or "front" not in reader.fieldnames or "back" not in reader.fieldnames:
+            raise ValueError("CSV must have a header row with at least 'front' and 'back'")
+        yield from reader
+    elif fmt == "ndjson":
+        for n, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"line {n}: {e}")
+            if not isinstance(item, dict):
+                raise ValueError(f"line {n}: expected a JSON object")
+            yield item
+    else:
+        raise ValueError("format must be 'csv' or 'ndjson'")
+
+
+class ImportState:
+    """Running totals for one import, carried across its batches. Holds no
+    per-row state, so an import of any size runs in O(batch) memory."""
+
+    def __init__(self, deck_id: Optional[str], user_id: Optional[str], update_existing: bool,
+                 started_at: Optional[datetime] = None, import_id: Optional[str] = None):
+        self.deck_id = deck_id
+        self.user_id = user_id
+        self.update_existing = update_existing
+        self.imported = 0
+        self.skipped = 0
+        self.updated = 0
+        self.rows = 0
+        # Stamped on every card this import creates, so later batches (or a
+        # resumed job) can tell them apart from cards that were already in the
+        # deck or were added meanwhile by someone else — including this admin.
+        self.import_id = import_id or str(uuid.uuid4())
+        # Created cards get created_at = started_at + row number (in µs), which
+        # keeps file order.
+        self.started_at = started_at or datetime.utcnow()
+        # Counter deltas not yet applied (see apply_counts()).
+        self._label_delta = Counter()
+        self._new_cards = 0
+        # Study-queue changes not yet published (see publish()).
+        self._before = []
+        self._after = []
+        self._overflow = False
+
+    def report(self) -> dict:
+        return {"imported": self.imported, "skipped": self.skipped, "updated": self.updated}
+
+    def _changed(self, before: List[dict], after: List[dict]) -> None:
+        if self._overflow:
+            return
+        self._before += before
+        self._after += after
+        if len(self._before) > MAX_INCREMENTAL_CARDS:
+            # The cache would drop every queue anyway; stop collecting.
+            self._overflow = True
+            self._before, self._after = [], []
+
+    def apply_counts(self, db: Session) -> None:
+        """Apply the label and deck count changes of the batches since the last
+        call. Call just before each commit."""
+        label_counts.apply_delta(db, self._label_delta)
+        if self.deck_id and self._new_cards:
+            db.execute(update(Deck).where(Deck.id == self.deck_id)
+                       .values(card_count=Deck.card_count + self._new_cards))
+        self._label_delta, self._new_cards = Counter(), 0
+
+    def publish(self) -> None:
+        """Tell the study-queue cache about the batches committed since the
+        last call. Call after each commit."""
+        if self._overflow:
+            queue_cache.drop_all()
+        else:
+            queue_cache.cards_changed(self._before, self._after)
+        self._before, self._after, self._overflow = [], [], False
+
+
+def import_batch(db: Session, items: Iterable[dict], state: ImportState) -> None:
+    """Load one batch of parsed rows in the caller's transaction. Rows that
+    repeat a key from an earlier batch are recognized by the match query, so
+    nothing is remembered between batches."""
+    pending = {}  # key -> [(ord, front, back, labels)], in file order
+    for item in items:
+        ord_ = state.rows
+        state.rows += 1
+        front = _clean_text(str(item.get("front") or "").strip())
+        back = _clean_text(str(item.get("back") or "").strip())
+        if not front or not back:
+            state.skipped += 1
+            continue
+        labels = [_clean_text(l) for l in _normalize_labels(item.get("labels"))]
+        pending.setdefault(content_hash(front, back), []).append((ord_, front, back, labels))
+    if not pending:
+        return
+
+    db.execute(_CREATE_IMPORT_ROWS)
+    db.execute(text("TRUNCATE import_rows"))
+    staged = []
+    for key, group in pending.items():
+        ord_, front, back, labels = group[0]
+        staged.append({"ord": ord_, "id": str(uuid.uuid4()), "front": front, "back": back,
+                       "labels": labels, "content_hash": key})
+    db.execute(insert(_import_rows), staged)
+
+    # Oldest deck card for each staged key: one join on the
+    # (deck_id, content_hash) index.
+    r = _import_rows.c
+    deck_match = Card.deck_id == state.deck_id if state.deck_id else Card.deck_id.is_(None)
+    found = {
+        ord_: (card_id, list(labels or []), import_id == state.import_id)
+        for ord_, card_id, labels, import_id in db.execute(
+            select(r.ord, Card.id, Card.labels, Card.import_id)
+            .join(Card, and_(deck_match, Card.content_hash == r.content_hash))
+            .distinct(r.ord)
+            .order_by(r.ord, Card.created_at, Card.id)
+        )
+    }
+
+    new_rows = []
+    touched = {}  # card_id -> labels before this batch
+    edited = {}   # card_id -> labels after it
+    for row, group in zip(staged, pending.values()):
+        match = found.get(row["ord"])
+        if match is None:
+            state.imported += 1
+            state.skipped += len(group) - 1
+            new_rows.append(row)
+            continue
+        card_id, labels, created_here = match
+        if created_here:
+            # A repeat of a row an earlier batch imported.
+            state.skipped += len(group)
+            continue
+        current = edited.get(card_id, labels)
+        for *_, new_labels in group:
+            # Refresh labels on the matching card if asked and they differ.
+            if state.update_existing and new_labels != current:
+                touched.setdefault(card_id, labels)
+                current = new_labels
+                state.updated += 1
+            else:
+                state.skipped += 1
+        if card_id in touched:
+            edited[card_id] = current
+
+    if new_rows:
+        db.execute(_INSERT_NEW_CARDS, {
+            "deck_id": state.deck_id, "user_id": state.user_id,
+            "created_at": state.started_at, "import_id": state.import_id,
+            "ords": [row["ord"] for row in new_rows],
+        })
+    if edited:
+        db.execute(update(Card), [{"id": cid, "labels": labels}
+                                  for cid, labels in sorted(edited.items())])
+    state._label_delta.update(label_counts.delta(
+        removed=list(touched.values()),
+        added=[row["labels"] for row in new_rows] + list(edited.values()),
+    ))
+    state._new_cards += len(new_rows)
+
+    def scope(card_id, labels):
+        return {"id": card_id, "deck_id": state.deck_id, "owner_id": None, "labels": labels}
+
+    state._changed(
+        [{}] * len(new_rows) + [scope(cid, touched[cid]) for cid in edited],
+        [scope(row["id"], row["labels"]) for row in new_rows]
+        + [scope(cid, labels) for cid, labels in edited.items()],
+    )
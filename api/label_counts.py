@@ -0,0 +1,130 @@
+"""Incrementally maintained label counts for GET /labels.
+
+Every path that creates, edits or deletes cards calls `adjust()` with the
+label lists it removed and added, inside its own transaction, so the counts in
+`label_counts` commit (or roll back) together with the cards. Reads are then a
+scan of a table with one row per distinct label.
+
+Counting rule (shared by `adjust`, `reconcile` and the migration backfill): a
+card contributes 1 for each label it carries, compared case-insensitively,
+under the first spelling it uses. Summing spellings by lower-case therefore
+gives exactly the number of cards `label_match` would return.
+
+Run as a script to repair any drift (e.g. from manual SQL edits):
+
+    python label_counts.py
+"""
+import sys
+from collections import Counter
+from typing import Iterable, List, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from db_models import LabelCount
+
+# The per-card counting rule, in SQL.
+_TRUE_COUNTS_SQL = """
+    SELECT spelling AS label, count(*) AS card_count FROM (
+        SELECT DISTINCT ON (c.id, lower(t.l)) t.l AS spelling
+        FROM cards c, unnest(c.labels) WITH ORDINALITY AS t(l, n)
+        ORDER BY c.id, lower(t.l), t.n
+    ) s
+    GROUP BY spelling
+"""
+
+
+def _contributions(labels: Optional[Iterable[str]]) -> List[str]:
+    """The spellings a card with these labels counts under."""
+    first = {}
+    for label in labels or []:
+        first.setdefault(label.lower(), label)
+    return list(first.values())
+
+
+def delta(removed: Iterable[Optional[List[str]]] = (),
+          added: Iterable[Optional[List[str]]] = ()) -> Counter:
+    """Per-label count changes for cards leaving (`removed`) and entering
+    (`added`) the table; an edit is the old labels removed plus the new ones
+    added."""
+    change = Counter()
+    for labels in removed:
+        change.subtract(_contributions(labels))
+    for labels in added:
+        change.update(_contributions(labels))
+    return change
+
+
+def adjust(db: Session, removed: Iterable[Optional[List[str]]] = (),
+           added: Iterable[Optional[List[str]]] = ()) -> None:
+    """Apply label deltas for cards leaving (`removed`) and entering (`added`)
+    the table. Runs in the caller's transaction as a single upsert."""
+    apply_delta(db, delta(removed, added))
+
+
+def apply_delta(db: Session, change: Counter) -> None:
+    """Apply a delta() (or a sum of several) in one upsert."""
+    rows = [{"label": l, "card_count": n} for l, n in sorted(change.items()) if n]
+    if not rows:
+        return
+    stmt = insert(LabelCount).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[LabelCount.label],
+        set_={"card_count": LabelCount.card_count + stmt.excluded.card_count},
+    ))
+
+
+def read(db: Session) -> List[dict]:
+    """[{label, card_count}] folded case-insensitively; each label is shown in
+    its most common spelling."""
+    groups = {}
+    for label, count in db.execute(
+        select(LabelCount.label, LabelCount.card_count).where(LabelCount.card_count > 0)
+    ):
+        g = groups.setdefault(label.lower(), {"label": label, "best": count, "card_count": 0})
+        g["card_count"] += count
+        if count > g["best"] or (count == g["best"] and label < g["label"]):
+            g["label"], g["best"] = label, count
+    return [{"label": g["label"], "card_count": g["card_count"]}
+            for _, g in sorted(groups.items())]
+
+
+def reconcile(db: Session) -> int:
+    """Recompute every count from the cards table and fix rows that drifted.
+    Holds an EXCLUSIVE lock on label_counts meanwhile, so concurrent writers
+    queue behind it and apply their deltas on top of the repaired values.
+    Returns the number of labels corrected."""
+    db.execute(text("LOCK TABLE label_counts IN EXCLUSIVE MODE"))
+    truth = dict(db.execute(text(_TRUE_COUNTS_SQL)).all())
+    stored = dict(db.execute(select(LabelCount.label, LabelCount.card_count)).all())
+    fixed = 0
+    for label in stored.keys() - truth.keys():
+        if stored[label]:
+            fixed += 1
+        db.execute(LabelCount.__table__.delete().where(LabelCount.label == label))
+    rows = [{"label": l, "card_count": n} for l, n in truth.items() if stored.get(l) != n]
+    if rows:
+        fixed += len(rows)
+        stmt = insert(LabelCount).values(rows)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[LabelCount.label],
+            set_={"card_count": stmt.excluded.card_count},
+        ))
+    db.commit()
+    return fixed
+
+
+def main() -> int:
+    from database import BatchSessionLocal
+
+    db = BatchSessionLocal()
+    try:
+        print(f"Reconciled label counts: {reconcile(db)} label(s) corrected.")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
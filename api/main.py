@@ -1,10 +1,24 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from routes import cards, auth, admin, study, decks, io, proposals
 from fastapi.middleware.cors import CORSMiddleware
-from config import CORS_ORIGINS
+from config import ASYNC_DB, CORS_ORIGINS
+from password_pool import PasswordPoolBusy
+from read_routing import RecentWriteMiddleware
 
 app = FastAPI(root_path='/api')
 
+
+@app.exception_handler(PasswordPoolBusy)
+def password_pool_busy(request: Request, exc: PasswordPoolBusy):
+    # Too many logins / user creations queued for bcrypt: shed instead of
+    # queueing them until they time out.
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, please retry shortly."},
+        headers={"Retry-After": "1"},
+    )
+
 # Credentialed (cookie) requests forbid the "*" wildcard, so origins must be an
 # explicit allowlist. Configure via the CORS_ORIGINS env var.
 app.add_middleware(
@@ -14,7 +28,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Pins a user's reads to the primary right after they write (no-op without a
+# read replica; see read_routing.py).
+app.add_middleware(RecentWriteMiddleware)
 
+# With ASYNC_DB the async hot routes go first so they take over those paths.
+if ASYNC_DB:
+    from routes import hot_async
+    app.include_router(hot_async.router)
 app.include_router(auth.router)
 app.include_router(cards.router)
 app.include_router(admin.router)
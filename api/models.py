@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
 from enum import Enum
 from datetime import datetime
@@ -39,6 +39,9 @@ class ImportRequest(BaseModel):
     # card's labels instead of being skipped — for re-uploading a list whose
     # labels changed. Default false keeps the safe skip-on-duplicate behavior.
     update_existing: bool = False
+    # When true the file is queued for import_worker.py and the response is a
+    # job id to poll at GET /import/jobs/{id}, instead of the final counts.
+    background: bool = False
 
 class CopyRequest(BaseModel):
     deck_id: Optional[str] = None  # target public deck (null = deck-less)
@@ -60,6 +63,19 @@ class ProgressStatus(str, Enum):
 class ReviewRequest(BaseModel):
     rating: str  # one of: again | hard | good | easy
 
+class ReviewEvent(BaseModel):
+    card_id: str
+    rating: str  # one of: again | hard | good | easy
+    # When the review happened on the client (default: now). Send it so a
+    # retried batch derives the same idempotency key.
+    reviewed_at: Optional[datetime] = None
+    # Client-chosen key that makes resubmitting this event a no-op. Derived from
+    # (card_id, reviewed_at) when omitted.
+    idempotency_key: Optional[str] = None
+
+class BatchReviewRequest(BaseModel):
+    reviews: List[ReviewEvent] = Field(max_length=500)
+
 class ProgressUpdate(BaseModel):
     notes: Optional[str] = None
     status: Optional[ProgressStatus] = None
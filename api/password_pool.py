@@ -0,0 +1,80 @@
+"""Bounded executor for bcrypt work.
+
+bcrypt is slow on purpose (~200 ms per hash or check). Running it inline ties
+up whichever thread the request is on, and a burst of logins can starve every
+other request. Instead hashing and verification go to a dedicated pool of
+PASSWORD_HASH_WORKERS threads (bcrypt releases the GIL, so they run in
+parallel), and at most PASSWORD_HASH_QUEUE calls may wait for it. Past that
+the call raises PasswordPoolBusy, which main.py turns into a 503 with
+Retry-After: shedding load early beats queueing logins until they time out.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE
+from jwt_utils import hash_password, verify_password
+
+
+class PasswordPoolBusy(Exception):
+    """Every worker is busy and the wait queue is full."""
+
+
+class PasswordPool:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        # One slot per running or waiting call.
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordPoolBusy()
+        with self._lock:
+            self._in_flight += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def call(self, fn, *args):
+        """Run `fn` on the pool and wait for it (from sync code)."""
+        return self.submit(fn, *args).result()
+
+    async def run(self, fn, *args):
+        """Run `fn` on the pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def hash(self, password: str) -> str:
+        return self.call(hash_password, password)
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        return self.call(verify_password, password, hashed_password)
+
+    async def verify_async(self, password: str, hashed_password: str) -> bool:
+        return await self.run(verify_password, password, hashed_password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+password_pool = PasswordPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE)
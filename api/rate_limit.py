@@ -1,12 +1,184 @@
 """Lightweight Redis-backed rate limiting.
 
-Implemented as a FastAPI dependency factory using a fixed-window counter in
-Redis (db0). Reuses existing infrastructure rather than adding a dependency.
-Keys are scoped by client IP + an endpoint-specific scope string.
+Implemented as a FastAPI dependency factory over a token bucket kept in Redis
+(db0): each bucket holds up to `limit` tokens and refills at
+limit / window_seconds per second, so bursts are capped at `limit` with no
+doubling at window edges. A check is a single Lua script call, which reads,
+refills, spends and re-arms the expiry of every bucket the request touches in
+one atomic round trip. Reuses existing infrastructure rather than adding a
+dependency.
+
+Buckets are keyed by scope plus client IP and/or the authenticated user.
+
+When Redis errors, checks fall back to the same token buckets kept in
+process memory (an LRU capped at LOCAL_MAX_KEYS), so login stays throttled
+through a Redis outage — per API worker rather than globally. A circuit
+breaker stops trying Redis for BREAKER_COOLDOWN_SECONDS after
+BREAKER_FAILURES consecutive errors, so an outage doesn't cost a connection
+timeout per request. Counters are exposed through limiter_stats().
 """
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
 from fastapi import Request, HTTPException, status
+from jwt_utils import verify_token
 from redis_client import r0
 
+# KEYS: bucket keys. ARGV: for each key, its capacity and refill rate (tokens
+# per ms). The request passes only if every bucket has a token, and then
+# spends one from each; a rejected request spends nothing. Time comes from the
+# Redis server, so API workers' clocks don't matter. Returns {allowed,
+# retry_after_ms}.
+_TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+local tokens, allowed, retry = {}, 1, 0
+for i, key in ipairs(KEYS) do
+    local cap = tonumber(ARGV[2 * i - 1])
+    local rate = tonumber(ARGV[2 * i])
+    local b = redis.call('HMGET', key, 'tokens', 'ts')
+    local level = tonumber(b[1]) or cap
+    local ts = tonumber(b[2]) or now
+    level = math.min(cap, level + math.max(0, now - ts) * rate)
+    tokens[i] = level
+    if level < 1 then
+        allowed = 0
+        retry = math.max(retry, math.ceil((1 - level) / rate))
+    end
+end
+for i, key in ipairs(KEYS) do
+    local cap = tonumber(ARGV[2 * i - 1])
+    local rate = tonumber(ARGV[2 * i])
+    local level = tokens[i] - allowed
+    redis.call('HSET', key, 'tokens', tostring(level), 'ts', now)
+    -- Expire once the bucket would be full again; a full bucket is the default.
+    redis.call('PEXPIRE', key, math.ceil((cap - level) / rate) + 1000)
+end
+return {allowed, retry}
+"""
+_token_bucket = r0.register_script(_TOKEN_BUCKET_LUA)
+
+# Buckets remembered per process while Redis is unavailable.
+LOCAL_MAX_KEYS = 10_000
+# Consecutive Redis errors that open the breaker, and how long it stays open
+# before one request is let through to probe Redis again.
+BREAKER_FAILURES = 3
+BREAKER_COOLDOWN_SECONDS = 10.0
+
+
+class _LocalBuckets:
+    """In-process token buckets, same rules as the Lua script."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, monotonic ms)
+        self._lock = threading.Lock()
+
+    def check(self, keys, args) -> tuple:
+        now = time.monotonic() * 1000
+        with self._lock:
+            levels, allowed, retry = [], 1, 0
+            for i, key in enumerate(keys):
+                cap, rate = args[2 * i], args[2 * i + 1]
+                level, ts = self._buckets.get(key, (cap, now))
+                level = min(cap, level + max(0.0, now - ts) * rate)
+                levels.append(level)
+                if level < 1:
+                    allowed = 0
+                    retry = max(retry, math.ceil((1 - level) / rate))
+            for key, level in zip(keys, levels):
+                self._buckets[key] = (level - allowed, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class _Breaker:
+    """Closed: use Redis. Open: skip it until the cooldown ends, then let one
+    probe through (half-open); its outcome closes or re-opens the breaker."""
+
+    def __init__(self, failures: int, cooldown: float):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._errors = 0
+        self._open_until = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opens = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._errors < self.failures:
+                return True
+            if self._probing or time.monotonic() < self._open_until:
+                return False
+            self._probing = True
+            return True
+
+    def success(self) -> None:
+        with self._lock:
+            self._errors = 0
+            self._probing = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self._errors += 1
+            self._probing = False
+            if self._errors >= self.failures:
+                if self._open_until <= time.monotonic():
+                    self.opens += 1
+                self._open_until = time.monotonic() + self.cooldown
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._errors < self.failures:
+                return "closed"
+            return "half_open" if time.monotonic() >= self._open_until else "open"
+
+
+_local = _LocalBuckets(LOCAL_MAX_KEYS)
+_breaker = _Breaker(BREAKER_FAILURES, BREAKER_COOLDOWN_SECONDS)
+_counters = {"redis_checks": 0, "redis_errors": 0, "local_checks": 0, "rejected": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def limiter_stats() -> dict:
+    """This process's limiter counters and breaker state."""
+    with _counters_lock:
+        stats = dict(_counters)
+    stats.update(breaker=_breaker.state, breaker_opens=_breaker.opens,
+                 local_buckets=len(_local))
+    return stats
+
+
+def _check(keys, args) -> tuple:
+    """(allowed, retry_after_ms): Redis when healthy, else the local buckets."""
+    if _breaker.allow():
+        try:
+            allowed, retry_ms = _token_bucket(keys=keys, args=args)
+        except Exception:
+            _breaker.failure()
+            _count("redis_errors")
+        else:
+            _breaker.success()
+            _count("redis_checks")
+            return int(allowed), int(retry_ms)
+    _count("local_checks")
+    return _local.check(keys, args)
+
 
 def _client_ip(request: Request) -> str:
     """Best-effort client IP, honoring a single proxy hop via X-Forwarded-For."""
@@ -16,30 +188,39 @@ def _client_ip(request: Request) -> str:
     return request.client.host if request.client else "unknown"
 
 
-def rate_limit(scope: str, limit: int, window_seconds: int):
+def _user_id(request: Request) -> Optional[str]:
+    payload = verify_token(request.cookies.get("access_token"))
+    return payload.get("user_id") if payload else None
+
+
+def rate_limit(scope: str, limit: Optional[int], window_seconds: int,
+               user_limit: Optional[int] = None):
     """Build a dependency that allows `limit` requests per `window_seconds`
-    per client IP for the given `scope`.
+    per client IP for the given `scope`, and (with `user_limit`) that many per
+    authenticated user as well. Pass limit=None to limit by user only.
 
-    Fails open: if Redis is unavailable we allow the request rather than
-    locking users out of auth entirely.
+    If Redis is unavailable the check runs against in-process buckets
+    instead (see module docstring), so limits still hold per worker.
     """
     def dependency(request: Request):
-        ip = _client_ip(request)
-        key = f"ratelimit:{scope}:{ip}"
-        try:
-            current = r0.incr(key)
-            if current == 1:
-                r0.expire(key, window_seconds)
-        except Exception:
-            return  # fail open on Redis errors
-
-        if current > limit:
-            ttl = r0.ttl(key)
-            retry_after = ttl if ttl and ttl > 0 else window_seconds
+        keys, args = [], []
+        if limit is not None:
+            keys.append(f"ratelimit:{scope}:ip:{_client_ip(request)}")
+            args += [limit, limit / (window_seconds * 1000)]
+        if user_limit is not None:
+            user_id = _user_id(request)
+            if user_id:
+                keys.append(f"ratelimit:{scope}:user:{user_id}")
+                args += [user_limit, user_limit / (window_seconds * 1000)]
+        if not keys:
+            return
+        allowed, retry_ms = _check(keys, args)
+        if not allowed:
+            _count("rejected")
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail="Too many requests. Please try again later.",
-                headers={"Retry-After": str(retry_after)},
+                headers={"Retry-After": str(max(1, math.ceil(retry_ms / 1000)))},
             )
 
     return dependency
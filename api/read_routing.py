@@ -0,0 +1,95 @@
+"""Send read-only endpoints to the read replica without losing read-your-writes.
+
+With DATABASE_READ_URL set, get_read_db hands out sessions on the replica
+(database.ReadSessionLocal). The replica lags the primary, so a user could
+read back a stale copy of their own write. To prevent that,
+RecentWriteMiddleware marks a user in Redis
+(`recent_write:{user_id}`, READ_AFTER_WRITE_SECONDS) whenever one of their
+write requests (any method but GET/HEAD/OPTIONS) succeeds. While the mark is
+there, get_read_db serves that user from the primary. The mark is set before
+the response goes out, so the client's next read already sees it. If Redis
+is unavailable, reads go to the primary as well.
+
+Without a replica, get_read_db is just get_db and nothing is marked.
+"""
+from typing import Optional
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+
+import database
+from config import READ_AFTER_WRITE_SECONDS
+from jwt_utils import verify_token
+from redis_client import r0
+
+_SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def _recent_write_key(user_id: str) -> str:
+    return f"recent_write:{user_id}"
+
+
+def replica_enabled() -> bool:
+    return database.ReadSessionLocal is not database.SessionLocal
+
+
+def _user_id(request: Request) -> Optional[str]:
+    payload = verify_token(request.cookies.get("access_token"))
+    return payload.get("user_id") if payload else None
+
+
+def mark_write(user_id: str) -> None:
+    """Pin the user's reads to the primary for READ_AFTER_WRITE_SECONDS."""
+    try:
+        r0.set(_recent_write_key(user_id), 1, ex=READ_AFTER_WRITE_SECONDS)
+    except Exception:
+        pass  # get_read_db can't see the mark either way; nothing to do
+
+
+def _pinned(user_id: str) -> bool:
+    try:
+        return bool(r0.exists(_recent_write_key(user_id)))
+    except Exception:
+        return True  # can't tell: the primary is always safe
+
+
+def read_session_factory(request: Request):
+    """The sessionmaker a read for this request should use."""
+    if not replica_enabled():
+        return database.SessionLocal
+    user_id = _user_id(request)
+    if user_id and _pinned(user_id):
+        return database.SessionLocal
+    return database.ReadSessionLocal
+
+
+def get_read_db(request: Request):
+    """Yield a request-scoped session for a read-only route (FastAPI
+    dependency): on the replica, or the primary for a user who just wrote."""
+    db = read_session_factory(request)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+class RecentWriteMiddleware:
+    """Marks the user after each successful write request (see module doc)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] in _SAFE_METHODS
+                or not replica_enabled()):
+            return await self.app(scope, receive, send)
+        user_id = _user_id(Request(scope))
+        if not user_id:
+            return await self.app(scope, receive, send)
+
+        async def send_marked(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                await run_in_threadpool(mark_write, user_id)
+            await send(message)
+
+        await self.app(scope, receive, send_marked)
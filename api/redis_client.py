@@ -3,8 +3,9 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-# Redis is used only for sessions and rate-limit counters. Application data
-# (users, cards, progress) lives in Postgres — see database.py.
+# Redis is used only for sessions, rate-limit counters and derived caches that
+# can be rebuilt at any time. Application data (users, cards, progress) lives
+# in Postgres — see database.py.
 redis_url_0 = os.getenv('REDIS_URL_0', 'redis://localhost:6379/0')
 REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', None)
 
@@ -0,0 +1,40 @@
+"""Retention for the batch review receipts (see routes/study.py review_cards).
+
+A receipt only has to outlive the client's retries of the batch it came from,
+so rows older than REVIEW_RECEIPT_RETENTION_DAYS are deleted rather than
+kept forever. Run as a script, e.g. from the same nightly cron as
+label_counts.py:
+
+    python review_receipts.py
+"""
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from config import REVIEW_RECEIPT_RETENTION_DAYS
+from db_models import ReviewReceipt
+
+
+def prune(db: Session, days: int = REVIEW_RECEIPT_RETENTION_DAYS) -> int:
+    """Delete receipts created more than `days` ago; returns how many."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    deleted = db.execute(delete(ReviewReceipt).where(ReviewReceipt.created_at < cutoff)).rowcount
+    db.commit()
+    return deleted
+
+
+def main() -> int:
+    from database import BatchSessionLocal
+
+    db = BatchSessionLocal()
+    try:
+        print(f"Pruned {prune(db)} review receipt(s).")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,31 +1,70 @@
+from typing import Optional
+
 from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.orm import Session
+
+from database import get_db
+from db_metrics import db_stats
+from password_pool import password_pool
+from rate_limit import limiter_stats
 from redis_client import r0
 from roles import require_roles
+from session_manager import session_manager
+from user_manager import user_manager
 
 router = APIRouter(prefix='/admin')
 
+# Sessions per page of GET /admin/sessions (default / max).
+DEFAULT_SESSION_PAGE = 100
+MAX_SESSION_PAGE = 500
+
+
+def _serialize_session(data: dict) -> dict:
+    return {
+        "session_id": data["session_id"],
+        "email": data["email"],
+        "user_id": data["user_id"],
+        "authenticated": str(data["authenticated"]),
+        "roles": data["roles"],
+        "created_at": data["created_at"],
+        "last_activity": data["last_activity"],
+    }
+
+
 @router.get("/sessions")
-def list_sessions(payload=Depends(require_roles(["admin"]))):
-    cursor = 0
-    sessions = []
+def list_sessions(cursor: str = "0", limit: int = DEFAULT_SESSION_PAGE,
+                  user_id: Optional[str] = None, email: Optional[str] = None,
+                  db: Session = Depends(get_db),
+                  payload=Depends(require_roles(["admin"]))):
+    """Live sessions, a page at a time.
+
+    Unfiltered, pages follow a Redis SCAN: pass back `next_cursor` until it's
+    null. A page holds about `limit` sessions (SCAN batches don't split
+    exactly), each batch fetched in one pipelined round trip. Filtering by
+    user_id or email reads that user's session index instead, in one page."""
+    limit = max(1, min(limit, MAX_SESSION_PAGE))
+    if email is not None:
+        user = user_manager.get_user_by_email(db, email)
+        if user is None:
+            return {"sessions": [], "next_cursor": None}
+        user_id = user.id
+    if user_id is not None:
+        sessions = session_manager.get_user_sessions(user_id)
+        return {"sessions": [_serialize_session(s) for s in sessions], "next_cursor": None}
 
+    try:
+        scan_cursor = int(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    sessions = []
     while True:
-        cursor, keys = r0.scan(cursor=cursor, match="session:*", count=100)
-        for key in keys:
-            session_id = key.split(":")[1]
-            data = r0.hgetall(key)
-            sessions.append({
-                "session_id": session_id,
-                "email": data.get("email"),
-                "user_id": data.get("user_id"),
-                "authenticated": data.get("authenticated"),
-                "roles": data.get("roles", "").split(","),
-                "created_at": data.get("created_at")
-            })
-        if cursor == 0:
+        scan_cursor, keys = r0.scan(cursor=scan_cursor, match="session:*", count=limit)
+        batch = session_manager.get_sessions(key.split(":", 1)[1] for key in keys)
+        sessions.extend(_serialize_session(s) for s in batch if s is not None)
+        if scan_cursor == 0 or len(sessions) >= limit:
             break
-
-    return {"sessions": sessions}
+    return {"sessions": sessions,
+            "next_cursor": str(scan_cursor) if scan_cursor != 0 else None}
 
 # NOTE: editing roles on a *session* was removed — roles are authoritative on
 # the user (and carried in the access-token JWT), not the session. Use the
@@ -39,9 +78,20 @@ def delete_session(session_id: str, payload=Depends(require_roles(["admin"]))):
     if not r0.exists(redis_key):
         raise HTTPException(status_code=404, detail="Session not found")
 
-    r0.delete(redis_key)
+    session_manager.invalidate_session(session_id)
     return {
         "message": f"Session {session_id} deleted",
         "session_id": session_id,
         "status": "force_logged_out"
     }
+
+
+@router.get("/metrics")
+def get_metrics(payload=Depends(require_roles(["admin"]))):
+    """Process-local counters for this API worker (each worker keeps its own)."""
+    return {
+        "session_activity": session_manager.activity_stats(),
+        "rate_limit": limiter_stats(),
+        "password_pool": password_pool.stats(),
+        "db": db_stats(),
+    }
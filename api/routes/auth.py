@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Request, HTTPException, status, Depends, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from jwt_utils import create_access_token, create_refresh_token, verify_token
 from roles import get_current_user, require_admin
@@ -7,8 +8,10 @@ from database import get_db
 from db_models import User
 from roles import require_authenticated
 from user_manager import user_manager
+from password_pool import password_pool
 from session_manager import session_manager
 from rate_limit import rate_limit
+from routes.cards import _default_deck_id
 from config import (
     COOKIE_SECURE,
     COOKIE_SAMESITE,
@@ -54,6 +57,15 @@ def _clear_auth_cookie(response: Response, key: str):
         samesite=COOKIE_SAMESITE,
     )
 
+def _ensure_my_cards_deck(db: Session, user: User):
+    """Card-creators always have their "My Cards" deck (shown even at 0 cards).
+    Done when someone logs in or gains a creator role, so GET /decks stays a
+    read-only query."""
+    if set(user.roles or []) & {"trusted", "admin"}:
+        _default_deck_id(db, user.id)
+        db.commit()
+
+
 @router.get("/health")
 def health_check():
     """Health check endpoint"""
@@ -67,9 +79,22 @@ def health_check():
     dependencies=[Depends(rate_limit("login", limit=10, window_seconds=300))],
 )
 async def login(response: Response, login_data: UserLogin, db: Session = Depends(get_db)):
-    """Authenticate user and create session"""
-    user = user_manager.authenticate_user(db, login_data.email, login_data.password)
+    """Authenticate user and create session.
+
+    The DB work runs in the threadpool; the bcrypt check in between is awaited
+    on the bounded password pool with neither a thread nor a DB connection
+    held, so a burst of logins can't starve either."""
+    creds = await run_in_threadpool(user_manager.login_credentials, db, login_data.email)
+    if not creds or not await password_pool.verify_async(login_data.password, creds[1]):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid email or password"
+        )
+    return await run_in_threadpool(_complete_login, response, db, creds[0])
+
 
+def _complete_login(response: Response, db: Session, user_id: str) -> dict:
+    user = user_manager.record_login(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -77,6 +102,7 @@ async def login(response: Response, login_data: UserLogin, db: Session = Depends
         )
 
     roles = list(user.roles or [])
+    _ensure_my_cards_deck(db, user)
 
     # Create session
     session_id = session_manager.create_session(
@@ -132,7 +158,7 @@ def whoami(request: Request, payload=Depends(get_current_user)):
     )
 
 @router.post("/refresh")
-async def refresh_token(request: Request, response: Response, db: Session = Depends(get_db)):
+def refresh_token(request: Request, response: Response, db: Session = Depends(get_db)):
     """Refresh access token using refresh token"""
     refresh_token = request.cookies.get("refresh_token")
     payload = verify_token(refresh_token)
@@ -237,6 +263,7 @@ def admin_create_user(data: AdminUserCreate, db: Session = Depends(get_db)):
         user = user_manager.create_user_with_roles(db, data.email, data.password, data.roles or ["user"])
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    _ensure_my_cards_deck(db, user)
     return {"message": "User created", "user_id": user.id, "email": user.email}
 
 @router.put("/users/{user_id}/roles")
@@ -252,6 +279,7 @@ def update_user_roles(user_id: str, role_update: RoleUpdateRequest,
         raise HTTPException(status_code=400, detail="You can't remove your own admin role")
 
     user_manager.update_user_roles(db, user_id, role_update.roles)
+    _ensure_my_cards_deck(db, user)
 
     # Invalidate user's sessions to force re-authentication with new roles
     session_manager.invalidate_user_sessions(user_id)
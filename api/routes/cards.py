@@ -1,19 +1,35 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from typing import List, Optional
 from datetime import datetime
+import base64
+import hashlib
+import json
 
-from sqlalchemy import select, func, or_, exists
+from collections import Counter
+
+from sqlalchemy import select, func, and_, or_, exists, tuple_, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from database import get_db
-from db_models import Card, Progress, Deck, User, DeckSubscription
+from db_models import Card, Progress, Deck, User, DeckSubscription, lower_labels
 from models import CardCreate, CardUpdate, ProgressUpdate, ProgressStatus, CopyRequest
+from read_routing import get_read_db
 from roles import require_roles, get_current_user, require_authenticated
+from redis_client import r0
+from study_cache import queue_cache, card_scope
+import label_counts
 import scheduler
 
 router = APIRouter()
 
+# Upper bound on a single page of GET /cards (and other keyset-paged lists).
+MAX_PAGE_SIZE = 200
+
+# /my-progress/summary is cached per user this long; the user's own progress
+# writes drop it immediately (see invalidate_summary).
+SUMMARY_TTL_SECONDS = 30
+
 
 def _is_admin(payload) -> bool:
     return bool(payload) and "admin" in (payload.get("roles") or [])
@@ -45,12 +61,26 @@ def can_view_card(card: Card, payload) -> bool:
 
 def label_match(label: str):
     """Case-insensitive test that a card carries `label` (in any letter case).
-    Uses EXISTS over unnest(labels) so '_' / '%' inside a label stay literal —
-    an `ILIKE ANY(labels)` shortcut would treat them as wildcards. Shared by the
-    card list and the study queue so label filtering matches everywhere."""
-    elem = func.unnest(Card.labels).column_valued("l")
-    return exists(
-        select(1).where(func.lower(elem) == label.lower())
+    Array containment on the lower-cased labels compares whole elements, so
+    '_' / '%' inside a label stay literal — an `ILIKE ANY(labels)` shortcut
+    would treat them as wildcards — and it is served by the GIN index on
+    lower_labels(labels). Shared by the card list and the study queue so label
+    filtering matches everywhere."""
+    return lower_labels(Card.labels).contains([label.lower()])
+
+
+def labels_match_any(labels: List[str]):
+    """A card carries at least one of `labels` (case-insensitive) — the OR of
+    label_match over the list, as a single indexable `&&`."""
+    return lower_labels(Card.labels).overlap([l.lower() for l in labels])
+
+
+def untracked_by(user_id: str):
+    """Cards the user has no progress row for, as a NOT EXISTS anti-join. Keeps
+    the tracked set in Postgres (served by the progress primary key) instead of
+    round-tripping it through Python as a huge `NOT IN (...)` parameter list."""
+    return ~exists(
+        select(1).where(Progress.user_id == user_id, Progress.card_id == Card.id)
     ).correlate(Card)
 
 
@@ -66,6 +96,21 @@ def _validate_public_deck(db: Session, deck_id):
     return deck_id
 
 
+def _adjust_deck_counts(db: Session, removed=(), added=()) -> None:
+    """Keep Deck.card_count current: `removed`/`added` are the deck ids of cards
+    leaving/entering decks (None entries — unfiled cards — are ignored). Runs
+    in the caller's transaction; decks are updated in id order so concurrent
+    writers lock them consistently."""
+    delta = Counter(d for d in added if d)
+    delta.subtract(d for d in removed if d)
+    for deck_id, n in sorted(delta.items()):
+        if n:
+            db.execute(
+                update(Deck).where(Deck.id == deck_id)
+                .values(card_count=Deck.card_count + n)
+            )
+
+
 def _default_deck_id(db: Session, user_id: str) -> str:
     """The user's single auto 'My Cards' private deck, created on first use.
     Race-safe: a concurrent create hits the unique index and we re-read."""
@@ -87,6 +132,71 @@ def _default_deck_id(db: Session, user_id: str) -> str:
     return deck.id
 
 
+# --- keyset pagination -----------------------------------------------------
+# Cursors are opaque to clients: url-safe base64 of a small JSON object holding
+# the sort key of the last row served. Pages are `WHERE key > cursor ORDER BY
+# key LIMIT n`, so each page is an index range scan regardless of depth.
+
+def _encode_cursor(data: dict) -> str:
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # "i" is compared against Card.id in SQL; anything but a string would
+    # surface as a database error instead of a bad request.
+    if not isinstance(data, dict) or not isinstance(data.get("i", ""), str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return data
+
+
+def _page_size(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _created_page(db: Session, stmt, limit: int, cursor: Optional[dict]):
+    """One page of `stmt` in stable (created_at, id) order. Returns (cards,
+    next_cursor_dict_or_None)."""
+    if cursor:
+        try:
+            after = (datetime.fromisoformat(cursor["c"]), cursor["i"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        stmt = stmt.where(tuple_(Card.created_at, Card.id) > after)
+    rows = list(db.scalars(stmt.order_by(Card.created_at, Card.id).limit(limit + 1)))
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, {"c": rows[-1].created_at.isoformat(), "i": rows[-1].id}
+
+
+def _shuffled_page(db: Session, stmt, limit: int, seed: str, cursor: Optional[dict]):
+    """One page of `stmt` in a reproducible shuffled order.
+
+    Rows are ordered by md5(seed || id), with the id breaking ties, so each
+    seed is its own permutation and the same seed always yields the same
+    order. The cursor carries the last row's (hash, id). Each page hashes the
+    filtered set and keeps the top `limit` (a bounded top-N sort, not a full
+    sort), so scope it by deck or label on large libraries."""
+    key = func.md5(func.concat(seed, Card.id))
+    if cursor:
+        after = (cursor.get("h"), cursor.get("i"))
+        if not isinstance(after[0], str) or after[1] is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        stmt = stmt.where(tuple_(key, Card.id) > after)
+    rows = db.execute(stmt.add_columns(key.label("shuffle_key"))
+                      .order_by(key, Card.id).limit(limit + 1)).all()
+    cards = [r[0] for r in rows[:limit]]
+    if len(rows) <= limit:
+        return cards, None
+    return cards, {"h": rows[limit - 1].shuffle_key, "i": cards[-1].id}
+
+
 # --- serialization helpers -------------------------------------------------
 
 def _iso(dt):
@@ -152,8 +262,11 @@ def create_card(card: CardCreate, db: Session = Depends(get_db),
         created_by=payload["user_id"],
     )
     db.add(new_card)
+    label_counts.adjust(db, added=[new_card.labels])
+    _adjust_deck_counts(db, added=[deck_id])
     db.commit()
     db.refresh(new_card)
+    queue_cache.cards_changed([{}], [card_scope(new_card)])
     return {"message": "Card created", "card_id": new_card.id, "owner_id": new_card.owner_id}
 
 
@@ -161,13 +274,21 @@ def create_card(card: CardCreate, db: Session = Depends(get_db),
 def get_cards(label: Optional[str] = None, deck_id: Optional[str] = None,
               deck_ids: Optional[str] = None,
               featured: bool = False, mine: bool = False, owner: Optional[str] = None,
-              db: Session = Depends(get_db), payload=Depends(get_current_user)):
+              limit: Optional[int] = None, cursor: Optional[str] = None,
+              shuffle: Optional[str] = None,
+              db: Session = Depends(get_read_db), payload=Depends(get_current_user)):
     """List cards the caller may see (public + their own private cards); includes
     per-card progress if authed.
 
     `featured=true` — only cards in featured decks (powers the public landing).
     `mine=true` — only the caller's own private cards ("My Cards").
     `deck_id` (single) or `deck_ids` (comma-separated) scope to deck(s).
+
+    Paging: pass `limit` (capped at MAX_PAGE_SIZE) and then the returned
+    `next_cursor` as `cursor` until it comes back null. Pages are in stable
+    (created_at, id) order, or — with `shuffle=<seed>` — a shuffled order that is
+    reproducible across pages for the same seed. Without `limit`/`cursor` the
+    whole (randomly ordered) list is returned, as before.
     """
     stmt = select(Card)
     if label:
@@ -187,15 +308,28 @@ def get_cards(label: Optional[str] = None, deck_id: Optional[str] = None,
         stmt = stmt.where(Card.owner_id == payload["user_id"])
     else:
         stmt = _visible_cards_stmt(stmt, payload)
-    cards = list(db.scalars(stmt.order_by(func.random())))
+
+    paged = limit is not None or cursor is not None
+    next_cursor = None
+    if paged:
+        size = _page_size(limit or MAX_PAGE_SIZE)
+        after = _decode_cursor(cursor) if cursor else None
+        if shuffle:
+            cards, nxt = _shuffled_page(db, stmt, size, shuffle, after)
+        else:
+            cards, nxt = _created_page(db, stmt, size, after)
+        next_cursor = _encode_cursor(nxt) if nxt else None
+    else:
+        cards = list(db.scalars(stmt.order_by(func.random())))
 
     authed = bool(payload and payload.get("authenticated"))
     progress_by_card = {}
-    if authed:
-        rows = db.scalars(
-            select(Progress).where(Progress.user_id == payload["user_id"])
-        )
-        progress_by_card = {p.card_id: p for p in rows}
+    if authed and cards:
+        prog_stmt = select(Progress).where(Progress.user_id == payload["user_id"])
+        if paged:
+            # Only the rows for this page, not the caller's whole history.
+            prog_stmt = prog_stmt.where(Progress.card_id.in_([c.id for c in cards]))
+        progress_by_card = {p.card_id: p for p in db.scalars(prog_stmt)}
 
     # Batch-resolve owner emails so private cards show whose they are.
     owner_ids = {c.owner_id for c in cards if c.owner_id}
@@ -203,13 +337,16 @@ def get_cards(label: Optional[str] = None, deck_id: Optional[str] = None,
     if owner_ids:
         email_by_id = dict(db.execute(select(User.id, User.email).where(User.id.in_(owner_ids))).all())
 
-    return {
+    body = {
         "cards": [
             _serialize_card(c, progress_by_card.get(c.id), include_progress=authed,
                             owner_email=email_by_id.get(c.owner_id))
             for c in cards
         ]
     }
+    if paged:
+        body["next_cursor"] = next_cursor
+    return body
 
 
 @router.get("/cards/{card_id}")
@@ -242,17 +379,22 @@ def update_card(card_id: str, card_update: CardUpdate, db: Session = Depends(get
     if not _can_modify_card(card, payload):
         raise HTTPException(status_code=403, detail="Not allowed")
 
+    before = card_scope(card)
     if card_update.front is not None:
         card.front = card_update.front
     if card_update.back is not None:
         card.back = card_update.back
     if card_update.labels is not None:
+        label_counts.adjust(db, removed=[card.labels], added=[card_update.labels])
         card.labels = card_update.labels
     # Only public (admin) cards can be re-filed; private cards stay in "My Cards".
     if card.owner_id is None and "deck_id" in card_update.model_fields_set:
-        card.deck_id = _validate_public_deck(db, card_update.deck_id)
+        new_deck = _validate_public_deck(db, card_update.deck_id)
+        _adjust_deck_counts(db, removed=[card.deck_id], added=[new_deck])
+        card.deck_id = new_deck
 
     db.commit()
+    queue_cache.cards_changed([before], [card_scope(card)])
     return {"message": "Card updated"}
 
 
@@ -266,8 +408,12 @@ def delete_card(card_id: str, db: Session = Depends(get_db),
     if not _can_modify_card(card, payload):
         raise HTTPException(status_code=403, detail="Not allowed")
 
+    before = card_scope(card)
+    label_counts.adjust(db, removed=[card.labels])
+    _adjust_deck_counts(db, removed=[card.deck_id])
     db.delete(card)
     db.commit()
+    queue_cache.cards_changed([before], [None])
     return {"message": "Card deleted"}
 
 
@@ -291,8 +437,11 @@ def copy_card_to_public(card_id: str, body: Optional[CopyRequest] = None,
         created_by=payload["user_id"],
     )
     db.add(new_card)
+    label_counts.adjust(db, added=[new_card.labels])
+    _adjust_deck_counts(db, added=[target_deck])
     db.commit()
     db.refresh(new_card)
+    queue_cache.cards_changed([{}], [card_scope(new_card)])
     return {"message": "Card copied to public", "card_id": new_card.id}
 
 
@@ -309,7 +458,8 @@ def update_card_progress(card_id: str, progress_update: ProgressUpdate,
 
     user_id = payload["user_id"]
     progress = db.get(Progress, (user_id, card_id))
-    if not progress:
+    created = progress is None
+    if created:
         progress = Progress(user_id=user_id, card_id=card_id)
         db.add(progress)
 
@@ -326,11 +476,15 @@ def update_card_progress(card_id: str, progress_update: ProgressUpdate,
         progress.review_count = (progress.review_count or 0) + 1
 
     db.commit()
+    invalidate_summary(user_id)
+    if created:
+        # The card is no longer "new" for this user.
+        queue_cache.track(user_id, [card_scope(card)], [None])
     return {"message": "Progress updated"}
 
 
 @router.get("/my-progress")
-def get_my_progress(db: Session = Depends(get_db),
+def get_my_progress(db: Session = Depends(get_read_db),
                     payload=Depends(require_authenticated)):
     """Get the caller's progress across all cards."""
     rows = db.scalars(
@@ -343,92 +497,136 @@ def get_my_progress(db: Session = Depends(get_db),
     }
 
 
+def _summary_key(user_id: str) -> str:
+    return f"progress_summary:{user_id}"
+
+
+def invalidate_summary(user_id: str) -> None:
+    """Drop the caller's cached progress summary after one of their progress
+    rows changed. Fails open, like every Redis cache here."""
+    try:
+        r0.delete(_summary_key(user_id))
+    except Exception:
+        pass
+
+
 @router.get("/my-progress/summary")
-def get_my_progress_summary(db: Session = Depends(get_db),
+def get_my_progress_summary(db: Session = Depends(get_read_db),
                             payload=Depends(require_authenticated)):
-    """Summary statistics of the caller's progress."""
-    status_counts = {s.value: 0 for s in ProgressStatus}
-    studied = 0
-    total_reviews = 0
-    due_now = 0
-    starred = 0
-    now = scheduler.now_utc()
+    """Summary statistics of the caller's progress.
 
-    rows = db.scalars(
-        select(Progress).where(Progress.user_id == payload["user_id"])
-    )
-    for p in rows:
-        studied += 1
-        if p.status in status_counts:
-            status_counts[p.status] += 1
-        total_reviews += p.review_count or 0
-        if p.flagged:
-            starred += 1
-        if p.due is not None and p.due <= now:
-            due_now += 1
+    One aggregate query (count ... FILTER per bucket, the visible-card total as
+    a scalar subquery), with due counts served by the partial (user_id, due)
+    index. The result is cached briefly per user."""
+    user_id = payload["user_id"]
+    try:
+        cached = r0.get(_summary_key(user_id))
+    except Exception:
+        cached = None
+    if cached:
+        return json.loads(cached)
 
+    now = scheduler.now_utc()
+    statuses = [s.value for s in ProgressStatus]
     # Total cards the caller can see (public + their own private cards).
-    total_cards = db.scalar(_visible_cards_stmt(select(func.count(Card.id)), payload)) or 0
+    total_cards_q = _visible_cards_stmt(select(func.count(Card.id)), payload).scalar_subquery()
+    row = db.execute(
+        select(
+            total_cards_q.label("total_cards"),
+            func.count().label("studied"),
+            func.coalesce(func.sum(Progress.review_count), 0).label("total_reviews"),
+            func.count().filter(Progress.flagged.is_(True)).label("starred"),
+            func.count().filter(Progress.due <= now).label("due_now"),
+            *[func.count().filter(Progress.status == s).label(f"status_{s}") for s in statuses],
+        ).where(Progress.user_id == user_id)
+    ).one()
+
+    status_counts = {s: row._mapping[f"status_{s}"] for s in statuses}
+    total_cards = row.total_cards or 0
     # Untouched cards are effectively "new" — fold them in so the breakdown
     # reflects the whole library, not just cards already studied.
-    status_counts["new"] += max(0, total_cards - studied)
+    status_counts["new"] += max(0, total_cards - row.studied)
 
-    return {
+    summary = {
         "total_cards": total_cards,
-        "total_cards_studied": studied,
-        "total_reviews": total_reviews,
-        "due_now": due_now,
-        "starred": starred,
+        "total_cards_studied": row.studied,
+        "total_reviews": int(row.total_reviews),
+        "due_now": row.due_now,
+        "starred": row.starred,
         "status_breakdown": status_counts,
     }
+    try:
+        r0.set(_summary_key(user_id), json.dumps(summary), ex=SUMMARY_TTL_SECONDS)
+    except Exception:
+        pass
+    return summary
 
 
 @router.get("/labels")
-def get_labels(db: Session = Depends(get_db)):
-    """All labels with their card counts (public)."""
-    sub = select(func.unnest(Card.labels).label("label")).subquery()
-    rows = db.execute(
-        select(sub.c.label, func.count()).group_by(sub.c.label)
-    ).all()
-    return {"labels": [{"label": label, "card_count": count} for label, count in rows]}
+def get_labels(request: Request, response: Response, db: Session = Depends(get_read_db)):
+    """All labels with their card counts (public).
+
+    Served from the incrementally maintained label_counts table (see
+    label_counts.py) and grouped case-insensitively, like label_match, so each
+    count is exactly what filtering by that label returns. Carries an ETag;
+    a matching If-None-Match gets an empty 304."""
+    labels = label_counts.read(db)
+    etag = '"%s"' % hashlib.sha1(
+        json.dumps(labels, separators=(",", ":")).encode()
+    ).hexdigest()[:20]
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return {"labels": labels}
 
 
 @router.get("/cards/by-status/{status}")
-def get_cards_by_status(status: str, db: Session = Depends(get_db),
+def get_cards_by_status(status: str, limit: Optional[int] = None,
+                        cursor: Optional[str] = None,
+                        db: Session = Depends(get_db),
                         payload=Depends(require_authenticated)):
-    """Cards filtered by the caller's progress status."""
+    """Cards filtered by the caller's progress status.
+
+    Paging works as in GET /cards: pass `limit` (capped at MAX_PAGE_SIZE) and
+    then `next_cursor` as `cursor` until it is null. Without `limit`/`cursor`
+    every matching card comes back, in (created_at, id) order, as before.
+    Status, visibility and — for "new" — the never-touched anti-join are all
+    applied in SQL."""
     try:
         ProgressStatus(status)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid status")
 
     user_id = payload["user_id"]
-    progress_rows = db.scalars(
-        select(Progress).where(
-            Progress.user_id == user_id, Progress.status == status
-        )
-    )
-    progress_by_card = {p.card_id: p for p in progress_rows}
-    card_ids = set(progress_by_card.keys())
-
-    # "new" also includes cards the user has never touched.
+    mine = and_(Progress.card_id == Card.id, Progress.user_id == user_id)
     if status == "new":
-        tracked = db.scalars(
-            select(Progress.card_id).where(Progress.user_id == user_id)
-        )
-        tracked_ids = set(tracked)
-        all_ids = set(db.scalars(select(Card.id)))
-        card_ids |= (all_ids - tracked_ids)
-
-    cards = []
-    if card_ids:
-        stmt = _visible_cards_stmt(select(Card).where(Card.id.in_(card_ids)), payload)
-        cards = list(db.scalars(stmt))
+        # "new" also includes cards the user has never touched.
+        stmt = (select(Card).outerjoin(Progress, mine)
+                .where(or_(Progress.card_id.is_(None), Progress.status == status)))
+    else:
+        stmt = select(Card).join(Progress, mine).where(Progress.status == status)
+    stmt = _visible_cards_stmt(stmt, payload)
+
+    paged = limit is not None or cursor is not None
+    prog_stmt = select(Progress).where(Progress.user_id == user_id)
+    if paged:
+        after = _decode_cursor(cursor) if cursor else None
+        cards, nxt = _created_page(db, stmt, _page_size(limit or MAX_PAGE_SIZE), after)
+        prog_stmt = prog_stmt.where(Progress.card_id.in_([c.id for c in cards]))
+    else:
+        cards = list(db.scalars(stmt.order_by(Card.created_at, Card.id)))
+        # Every listed card's progress (if any) has this status.
+        prog_stmt = prog_stmt.where(Progress.status == status)
+    progress_by_card = {p.card_id: p for p in db.scalars(prog_stmt)} if cards else {}
     serialized = [
         _serialize_card(c, progress_by_card.get(c.id), include_progress=True)
         for c in cards
     ]
-    return {"cards": serialized, "status": status, "count": len(serialized)}
+    body = {"cards": serialized, "status": status, "count": len(serialized)}
+    if paged:
+        body["next_cursor"] = _encode_cursor(nxt) if nxt else None
+    return body
 
 
 @router.delete("/my-progress/{card_id}")
@@ -440,6 +638,10 @@ def reset_card_progress(card_id: str, db: Session = Depends(get_db),
         raise HTTPException(status_code=404, detail="No progress found for this card")
     db.delete(progress)
     db.commit()
+    invalidate_summary(payload["user_id"])
+    card = db.get(Card, card_id)
+    if card:
+        queue_cache.untrack(payload["user_id"], card_scope(card))
     return {"message": "Progress reset for card"}
 
 
@@ -451,4 +653,6 @@ def reset_all_progress(db: Session = Depends(get_db),
         Progress.user_id == payload["user_id"]
     ).delete(synchronize_session=False)
     db.commit()
+    invalidate_summary(payload["user_id"])
+    queue_cache.drop_user(payload["user_id"])
     return {"message": f"Reset progress for {deleted} cards"}
@@ -1,19 +1,23 @@
+from itertools import groupby
 from typing import Optional
 
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy import select, func, or_
+from sqlalchemy import select, or_, func
 from sqlalchemy.orm import Session
 
 from database import get_db
 from db_models import Deck, Card, DeckSubscription
 from models import DeckCreate, DeckUpdate
+from read_routing import get_read_db
 from roles import require_roles, get_current_user, require_authenticated
-from routes.cards import _is_admin, _default_deck_id
+from routes.cards import _is_admin, _serialize_card
+from study_cache import queue_cache, card_scope
+import label_counts
 
 router = APIRouter()
 
 
-def _serialize_deck(deck: Deck, card_count: int = 0, subscribed: bool = False) -> dict:
+def _serialize_deck(deck: Deck, subscribed: bool = False) -> dict:
     return {
         "deck_id": deck.id,
         "name": deck.name,
@@ -22,7 +26,7 @@ def _serialize_deck(deck: Deck, card_count: int = 0, subscribed: bool = False) -
         "owner_id": deck.owner_id,
         "created_by": deck.created_by,
         "created_at": deck.created_at.isoformat() if deck.created_at else None,
-        "card_count": card_count,
+        "card_count": deck.card_count or 0,
         "subscribed": subscribed,
     }
 
@@ -44,22 +48,12 @@ def _visible_decks_stmt(stmt, payload):
 
 
 @router.get("/decks")
-def list_decks(db: Session = Depends(get_db), payload=Depends(get_current_user)):
-    """Decks the caller may see (public + their own), with card counts."""
-    # Ensure card-creators always have their "My Cards" deck (shown even at 0 cards).
-    if payload and payload.get("authenticated") and (
-        set(payload.get("roles", [])) & {"trusted", "admin"}
-    ):
-        _default_deck_id(db, payload["user_id"])
-        db.commit()
+def list_decks(db: Session = Depends(get_read_db), payload=Depends(get_current_user)):
+    """Decks the caller may see (public + their own), with card counts.
 
-    counts = dict(
-        db.execute(
-            select(Card.deck_id, func.count())
-            .where(Card.deck_id.is_not(None))
-            .group_by(Card.deck_id)
-        ).all()
-    )
+    Read-only: counts are the denormalized Deck.card_count, and card-creators'
+    "My Cards" deck is ensured at login / role change (routes/auth.py) rather
+    than here."""
     # Batch-load the caller's subscriptions so each deck can report `subscribed`.
     subscribed = set()
     if payload and payload.get("authenticated"):
@@ -69,7 +63,7 @@ def list_decks(db: Session = Depends(get_db), payload=Depends(get_current_user))
         ))
     decks = db.scalars(_visible_decks_stmt(select(Deck), payload).order_by(Deck.name))
     return {"decks": [
-        _serialize_deck(d, counts.get(d.id, 0), d.id in subscribed) for d in decks
+        _serialize_deck(d, d.id in subscribed) for d in decks
     ]}
 
 
@@ -81,11 +75,35 @@ def get_deck(deck_id: str, db: Session = Depends(get_db), payload=Depends(get_cu
     # Hide others' private decks.
     if not _can_view_deck(deck, payload):
         raise HTTPException(status_code=404, detail="Deck not found")
-    count = db.scalar(select(func.count()).where(Card.deck_id == deck_id)) or 0
     subscribed = False
     if payload and payload.get("authenticated"):
         subscribed = db.get(DeckSubscription, (payload["user_id"], deck_id)) is not None
-    return {"deck": _serialize_deck(deck, count, subscribed)}
+    return {"deck": _serialize_deck(deck, subscribed)}
+
+
+@router.get("/decks/{deck_id}/duplicates")
+def deck_duplicates(deck_id: str, db: Session = Depends(get_db),
+                    payload=Depends(require_roles(["admin"]))):
+    """Clusters of cards in a deck with the same content once trimmed,
+    NFC-normalized and casefolded (Card.content_hash) — admin only. Both
+    queries read the (deck_id, content_hash) index, so only the duplicated
+    cards themselves are fetched."""
+    if not db.get(Deck, deck_id):
+        raise HTTPException(status_code=404, detail="Deck not found")
+    dup_hashes = (
+        select(Card.content_hash).where(Card.deck_id == deck_id)
+        .group_by(Card.content_hash).having(func.count() > 1)
+    )
+    cards = db.scalars(
+        select(Card)
+        .where(Card.deck_id == deck_id, Card.content_hash.in_(dup_hashes))
+        .order_by(Card.content_hash, Card.created_at, Card.id)
+    )
+    clusters = [
+        {"content_hash": h, "cards": [_serialize_card(c) for c in group]}
+        for h, group in groupby(cards, key=lambda c: c.content_hash)
+    ]
+    return {"deck_id": deck_id, "clusters": clusters}
 
 
 @router.post("/decks")
@@ -137,13 +155,21 @@ def delete_deck(deck_id: str, delete_cards: bool = False,
     deck = db.get(Deck, deck_id)
     if not deck:
         raise HTTPException(status_code=404, detail="Deck not found")
+    # The deck's cards either vanish or become unfiled; either way they leave
+    # any study queue scoped to this deck.
+    before = [card_scope(c) for c in db.execute(
+        select(Card.id, Card.deck_id, Card.owner_id, Card.labels).where(Card.deck_id == deck_id)
+    )]
+    after = [None if delete_cards else {**c, "deck_id": None} for c in before]
     deleted_cards = 0
     if delete_cards:
+        label_counts.adjust(db, removed=[c["labels"] for c in before])
         deleted_cards = db.query(Card).filter(Card.deck_id == deck_id).delete(
             synchronize_session=False
         )
     db.delete(deck)
     db.commit()
+    queue_cache.cards_changed(before, after)
     return {"message": "Deck deleted", "deleted_cards": deleted_cards}
 
 
@@ -0,0 +1,129 @@
+"""Async versions of the hot routes, served when ASYNC_DB is on.
+
+main.py includes this router ahead of the sync ones, so these handlers take
+over the same paths with the same parameters, dependencies and responses.
+They run as coroutines on the asyncpg engine (database.get_async_db): a
+request waiting on Postgres holds a pooled connection but no thread, so
+concurrency is bounded by the pool rather than by Starlette's threadpool.
+
+Redis stays on the sync client. Per-request Redis calls are handed to the
+threadpool; GET /cards and the cold-cache queue build reuse the sync code via
+AsyncSession.run_sync, which runs it on the event loop.
+"""
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_db
+from db_models import Card, Deck, DeckSubscription, Progress
+from models import ReviewRequest
+from rate_limit import rate_limit
+from roles import get_current_user, require_authenticated
+from routes import cards, study
+from routes.decks import _serialize_deck, _visible_decks_stmt
+from study_cache import queue_cache, scope_hash, card_scope
+import scheduler
+
+router = APIRouter()
+
+
+@router.get("/study/queue")
+async def study_queue(limit: int = 20, deck_id: Optional[str] = None,
+                      deck_ids: Optional[str] = None,
+                      labels: Optional[List[str]] = Query(None),
+                      db: AsyncSession = Depends(get_async_db),
+                      payload=Depends(require_authenticated)):
+    """Async twin of routes.study.study_queue."""
+    user_id = payload["user_id"]
+    now = scheduler.now_utc()
+    decks = study._deck_id_list(deck_ids) or ([deck_id] if deck_id else None)
+
+    scope = scope_hash(decks, labels)
+    cached = await run_in_threadpool(queue_cache.load, user_id, scope, now, limit)
+    if cached is None:
+        rows = await db.run_sync(study._materialize_queue, user_id, decks, labels, limit)
+        # The Redis client is synchronous: keep it off the event loop.
+        await run_in_threadpool(queue_cache.store, user_id, scope, decks, labels, *rows)
+        cached = study._materialized(*rows, now)
+    new_ids = cached["new"][:max(limit, 0)]
+    due_ids = cached["due"]
+
+    ids = new_ids + due_ids
+    cards_by_id = {c.id: c for c in await db.scalars(
+        select(Card).where(Card.id.in_(ids)))} if ids else {}
+    progress_by_card = {p.card_id: p for p in await db.scalars(
+        select(Progress).where(Progress.user_id == user_id, Progress.card_id.in_(due_ids))
+    )} if due_ids else {}
+    return study._build_queue(new_ids, due_ids, cards_by_id, progress_by_card,
+                              cached["new_available"])
+
+
+@router.post(
+    "/cards/{card_id}/review",
+    dependencies=[Depends(rate_limit("review", limit=600, window_seconds=60, user_limit=120))],
+)
+async def review_card(card_id: str, review: ReviewRequest,
+                      db: AsyncSession = Depends(get_async_db),
+                      payload=Depends(require_authenticated)):
+    """Async twin of routes.study.review_card."""
+    card = await db.get(Card, card_id)
+    if not card or not cards.can_view_card(card, payload):
+        raise HTTPException(status_code=404, detail="Card not found")
+
+    user_id = payload["user_id"]
+    progress = await db.get(Progress, (user_id, card_id))
+    if not progress:
+        progress = Progress(user_id=user_id, card_id=card_id)
+        db.add(progress)
+
+    due, status = study._apply_review(progress, review.rating)
+
+    scope = card_scope(card)
+    await db.commit()
+    await run_in_threadpool(_after_review, user_id, scope, due)
+    return {
+        "message": "Review recorded",
+        "due": due.isoformat(),
+        "status": status,
+        "review_count": progress.review_count,
+    }
+
+
+def _after_review(user_id: str, scope, due) -> None:
+    cards.invalidate_summary(user_id)
+    queue_cache.track(user_id, [scope], [due])
+
+
+@router.get("/cards")
+async def get_cards(label: Optional[str] = None, deck_id: Optional[str] = None,
+                    deck_ids: Optional[str] = None,
+                    featured: bool = False, mine: bool = False, owner: Optional[str] = None,
+                    limit: Optional[int] = None, cursor: Optional[str] = None,
+                    shuffle: Optional[str] = None,
+                    db: AsyncSession = Depends(get_async_db),
+                    payload=Depends(get_current_user)):
+    """Async twin of routes.cards.get_cards (same code, via run_sync)."""
+    return await db.run_sync(lambda session: cards.get_cards(
+        label=label, deck_id=deck_id, deck_ids=deck_ids, featured=featured, mine=mine,
+        owner=owner, limit=limit, cursor=cursor, shuffle=shuffle,
+        db=session, payload=payload,
+    ))
+
+
+@router.get("/decks")
+async def list_decks(db: AsyncSession = Depends(get_async_db),
+                     payload=Depends(get_current_user)):
+    """Async twin of routes.decks.list_decks."""
+    subscribed = set()
+    if payload and payload.get("authenticated"):
+        subscribed = set(await db.scalars(
+            select(DeckSubscription.deck_id)
+            .where(DeckSubscription.user_id == payload["user_id"])
+        ))
+    decks = await db.scalars(_visible_decks_stmt(select(Deck), payload).order_by(Deck.name))
+    return {"decks": [
+        _serialize_deck(d, d.id in subscribed) for d in decks
+    ]}
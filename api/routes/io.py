@@ -1,121 +1,205 @@
 """Bulk import / export of cards (CSV and JSON).
 
-Export streams a downloadable file. Import accepts the file *text* in a JSON
-body (no multipart, so no extra dependency) and bulk-creates cards.
+Export streams a downloadable file straight from a server-side cursor, so
+memory stays flat however many cards are exported. Import accepts the file
+*text* in a JSON body, or the raw file as a streamed request body (no
+multipart, so no extra dependency), and bulk-creates cards in set-based
+batches (see importer.py).
 """
+import codecs
 import csv
 import io
 import json
-import re
-import unicodedata
-from typing import Optional, List
+import zlib
+from itertools import islice
+from typing import Iterator, Optional
 
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import Response
+import anyio
+
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 
-from database import get_db
-from db_models import Card, Deck
+from database import get_db, SessionLocal
+from db_models import Card, Deck, ImportJob
+from importer import (
+    IMPORT_BATCH_ROWS, LABELS_SEP, ImportState, _iter_content, _parse_content, import_batch,
+)
 from models import ImportRequest
+from rate_limit import rate_limit
+from read_routing import read_session_factory
 from roles import require_authenticated, require_roles
 from routes.cards import _visible_cards_stmt
 
 router = APIRouter()
 
-# Labels are multi-valued; join with "|" inside a single CSV cell to avoid
-# colliding with the field comma.
-LABELS_SEP = "|"
-
-# Control characters (minus tab/newline/CR) and the Unicode replacement char,
-# which is what shows up when a file was previously mis-decoded. We replace these
-# with spaces rather than reject the whole import.
-_GARBAGE_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f�]")
-
-
-def _clean_text(s: str) -> str:
-    """Make imported text safe to store: normalize and replace garbage chars
-    with spaces. Legitimate Unicode (em-dashes, accents, emoji) is preserved."""
-    if not s:
-        return s
-    s = unicodedata.normalize("NFC", s)
-    return _GARBAGE_RE.sub(" ", s)
-
-
-def _normalize_labels(value) -> List[str]:
-    if value is None:
-        return []
-    if isinstance(value, list):
-        return [str(v).strip() for v in value if str(v).strip()]
-    # string form: split on the labels separator (and tolerate commas)
-    parts = str(value).replace(",", LABELS_SEP).split(LABELS_SEP)
-    return [p.strip() for p in parts if p.strip()]
-
-
-def _parse_content(fmt: str, content: str) -> List[dict]:
-    fmt = fmt.lower()
-    if fmt == "json":
-        data = json.loads(content)
-        items = data.get("cards", data) if isinstance(data, dict) else data
-        if not isinstance(items, list):
-            raise ValueError("JSON must be a list of cards or {\"cards\": [...]}")
-        return items
-    if fmt == "csv":
-        reader = csv.DictReader(io.StringIO(content))
-        if not reader.fieldnames or "front" not in reader.fieldnames or "back" not in reader.fieldnames:
-            raise ValueError("CSV must have a header row with at least 'front' and 'back'")
-        return list(reader)
-    raise ValueError("format must be 'csv' or 'json'")
+# Rows fetched per server-side cursor round trip during export, and the size
+# of each chunk handed to the client.
+EXPORT_BATCH_ROWS = 1000
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def _export_chunks(stmt, fmt: str, session_factory=SessionLocal) -> Iterator[str]:
+    """Render the export incrementally from a server-side cursor.
+
+    Runs in its own session: the response body is produced after the request's
+    dependencies (and its get_db session) have already been torn down."""
+    db = session_factory()
+    try:
+        rows = db.execute(stmt.execution_options(yield_per=EXPORT_BATCH_ROWS))
+        buf = io.StringIO()
+        if fmt == "json":
+            buf.write('{"cards": [')
+            first = True
+            for front, back, labels in rows:
+                buf.write("\n  " if first else ",\n  ")
+                first = False
+                json.dump({"front": front, "back": back, "labels": list(labels or [])},
+                          buf, ensure_ascii=False)
+                if buf.tell() >= EXPORT_CHUNK_BYTES:
+                    yield buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+            buf.write("\n]}\n")
+        else:
+            writer = csv.writer(buf)
+            writer.writerow(["front", "back", "labels"])
+            for front, back, labels in rows:
+                writer.writerow([front, back, LABELS_SEP.join(labels or [])])
+                if buf.tell() >= EXPORT_CHUNK_BYTES:
+                    yield buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+        yield buf.getvalue()
+    finally:
+        db.close()
+
+
+def _gzip_chunks(chunks: Iterator[str]) -> Iterator[bytes]:
+    """Gzip a text stream on the fly."""
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        out = z.compress(chunk.encode("utf-8"))
+        if out:
+            yield out
+    yield z.flush()
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip: listed (or covered by
+    "*") with a non-zero q-value. An explicit entry beats "*"."""
+    q_by_coding = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        q_by_coding[coding] = q
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in q_by_coding:
+            return q_by_coding[coding] > 0
+    return False
 
 
 @router.get("/export/cards")
-def export_cards(format: str = "json", deck_id: Optional[str] = None,
-                 db: Session = Depends(get_db),
+def export_cards(request: Request, format: str = "json", deck_id: Optional[str] = None,
                  payload=Depends(require_authenticated)):
-    """Download cards (optionally one deck) as JSON or CSV."""
+    """Download cards (optionally one deck) as JSON or CSV.
+
+    Streamed: rows come off a server-side cursor in batches and are written
+    out as they arrive. Gzip-compressed on the fly when the client accepts it."""
     fmt = format.lower()
     if fmt not in ("json", "csv"):
         raise HTTPException(status_code=400, detail="format must be 'csv' or 'json'")
 
-    stmt = select(Card)
+    stmt = select(Card.front, Card.back, Card.labels)
     if deck_id:
         stmt = stmt.where(Card.deck_id == deck_id)
     # Only export cards the caller may see (public + own; admins see all).
     stmt = _visible_cards_stmt(stmt, payload)
-    cards = list(db.scalars(stmt))
-    rows = [{"front": c.front, "back": c.back, "labels": list(c.labels or [])} for c in cards]
 
-    if fmt == "json":
-        body = json.dumps({"cards": rows}, indent=2, ensure_ascii=False)
-        media, filename = "application/json", "cards.json"
-    else:
-        buf = io.StringIO()
-        writer = csv.writer(buf)
-        writer.writerow(["front", "back", "labels"])
-        for r in rows:
-            writer.writerow([r["front"], r["back"], LABELS_SEP.join(r["labels"])])
-        body, media, filename = buf.getvalue(), "text/csv", "cards.csv"
+    media, filename = ("application/json", "cards.json") if fmt == "json" else ("text/csv", "cards.csv")
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"',
+               "Vary": "Accept-Encoding"}
+    body = _export_chunks(stmt, fmt, read_session_factory(request))
+    if _accepts_gzip(request.headers.get("accept-encoding", "")):
+        headers["Content-Encoding"] = "gzip"
+        body = _gzip_chunks(body)
+    return StreamingResponse(body, media_type=media, headers=headers)
 
-    return Response(
-        content=body,
-        media_type=media,
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
 
+_SAVE_FAILED = ("Import failed while saving. The file may contain characters "
+                "the database can't store — try re-exporting it as UTF-8.")
 
-@router.post("/import/cards")
-def import_cards(req: ImportRequest, db: Session = Depends(get_db),
-                 payload=Depends(require_roles(["admin"]))):
-    """Bulk-create cards from CSV/JSON text. Admin only."""
-    if req.deck_id:
-        deck = db.get(Deck, req.deck_id)
+
+def _check_import_deck(db: Session, deck_id: Optional[str]) -> None:
+    if deck_id:
+        deck = db.get(Deck, deck_id)
         if not deck:
             raise HTTPException(status_code=400, detail="Deck not found")
         # Imported cards are public; they can only go into a public deck.
         if deck.owner_id is not None:
             raise HTTPException(status_code=400, detail="Can only import into public decks")
 
+
+def _body_lines(request: Request) -> Iterator[str]:
+    """The request body as text lines (endings kept), read as it arrives.
+
+    Called from a sync route, i.e. in a worker thread: each chunk is awaited
+    on the event loop via anyio, so only one chunk is held at a time."""
+    chunks = request.stream().__aiter__()
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    tail = ""
+    while True:
+        try:
+            chunk = anyio.from_thread.run(chunks.__anext__)
+        except StopAsyncIteration:
+            break
+        *lines, tail = (tail + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line + "\n"
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+@router.post(
+    "/import/cards",
+    dependencies=[Depends(rate_limit("import", limit=None, window_seconds=600, user_limit=30))],
+)
+def import_cards(req: ImportRequest, response: Response, db: Session = Depends(get_db),
+                 payload=Depends(require_roles(["admin"]))):
+    """Bulk-create cards from CSV/JSON text. Admin only.
+
+    With `background`, the file is queued for import_worker.py and a 202 with
+    the job id comes back immediately; otherwise the import runs inline."""
+    _check_import_deck(db, req.deck_id)
+
+    if req.background:
+        job = ImportJob(
+            created_by=payload["user_id"],
+            deck_id=req.deck_id,
+            format=req.format,
+            content=req.content,
+            update_existing=req.update_existing,
+        )
+        db.add(job)
+        db.flush()
+        job_id = job.id  # read before commit expires it (a reload would fetch the file back)
+        db.commit()
+        response.status_code = 202
+        return {"job_id": job_id, "status": "queued"}
+
     try:
         items = _parse_content(req.format, req.content)
     except (ValueError, json.JSONDecodeError) as e:
@@ -124,54 +208,71 @@ def import_cards(req: ImportRequest, db: Session = Depends(get_db),
     # De-dup against cards already in the target deck (same front+back), so
     # re-importing an overlapping list doesn't create duplicates. Also catches
     # repeats within the file itself. Keys are case-insensitive on trimmed text.
-    def _key(front: str, back: str) -> tuple:
-        return (front.casefold(), back.casefold())
-
-    # Map existing cards in the deck by their (front, back) key. With
-    # update_existing, a matching row refreshes that card's labels; otherwise a
-    # match is skipped (and the map is only used as a membership set).
-    existing_by_key = {}
-    for card in db.scalars(select(Card).where(Card.deck_id == req.deck_id)):
-        existing_by_key.setdefault(_key(card.front, card.back), card)
-    seen = set(existing_by_key.keys())
-
-    imported = 0
-    skipped = 0
-    updated = 0
-    for item in items:
-        front = _clean_text(str(item.get("front") or "").strip())
-        back = _clean_text(str(item.get("back") or "").strip())
-        if not front or not back:
-            skipped += 1
-            continue
-        labels = [_clean_text(l) for l in _normalize_labels(item.get("labels"))]
-        key = _key(front, back)
-        if key in seen:
-            existing = existing_by_key.get(key)
-            # Refresh labels on the matching card if asked and they differ.
-            if req.update_existing and existing is not None and list(existing.labels or []) != labels:
-                existing.labels = labels
-                updated += 1
-            else:
-                skipped += 1
-            continue
-        seen.add(key)
-        db.add(Card(
-            front=front,
-            back=back,
-            labels=labels,
-            deck_id=req.deck_id,
-            created_by=payload["user_id"],
-        ))
-        imported += 1
+    state = ImportState(req.deck_id, payload["user_id"], req.update_existing)
+    try:
+        for i in range(0, len(items), IMPORT_BATCH_ROWS):
+            import_batch(db, items[i:i + IMPORT_BATCH_ROWS], state)
+        state.apply_counts(db)
+        db.commit()
+    except (SQLAlchemyError, UnicodeError):
+        db.rollback()
+        raise HTTPException(status_code=400, detail=_SAVE_FAILED)
+    state.publish()
+    return state.report()
+
+
+@router.post(
+    "/import/cards/upload",
+    dependencies=[Depends(rate_limit("import", limit=None, window_seconds=600, user_limit=30))],
+)
+def upload_cards(request: Request, format: str = "csv", deck_id: Optional[str] = None,
+                 update_existing: bool = False, db: Session = Depends(get_db),
+                 payload=Depends(require_roles(["admin"]))):
+    """Import a raw CSV or NDJSON file sent as the request body. Admin only.
 
+    The body is parsed as it streams in and handed to the importer
+    IMPORT_BATCH_ROWS rows at a time, so memory stays bounded however large
+    the file is. Same dedup rules and report as POST /import/cards, and the
+    whole file is still one transaction."""
+    _check_import_deck(db, deck_id)
+    state = ImportState(deck_id, payload["user_id"], update_existing)
+    rows = _iter_content(format, _body_lines(request))
     try:
+        while True:
+            batch = list(islice(rows, IMPORT_BATCH_ROWS))
+            if not batch:
+                break
+            import_batch(db, batch, state)
+        state.apply_counts(db)
         db.commit()
+    except (ValueError, csv.Error) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Could not parse {format}: {e}")
     except (SQLAlchemyError, UnicodeError):
         db.rollback()
-        raise HTTPException(
-            status_code=400,
-            detail="Import failed while saving. The file may contain characters "
-                   "the database can't store — try re-exporting it as UTF-8.",
-        )
-    return {"imported": imported, "skipped": skipped, "updated": updated}
+        raise HTTPException(status_code=400, detail=_SAVE_FAILED)
+    state.publish()
+    return state.report()
+
+
+@router.get("/import/jobs/{job_id}")
+def get_import_job(job_id: str, db: Session = Depends(get_db),
+                   payload=Depends(require_roles(["admin"]))):
+    """Progress of a background import. Admin only."""
+    job = db.get(ImportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "deck_id": job.deck_id,
+        "rows_total": job.rows_total,
+        "rows_parsed": job.rows_parsed,
+        "imported": job.imported,
+        "skipped": job.skipped,
+        "updated": job.updated,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -10,6 +10,8 @@ from db_models import Card, CardProposal, User
 from models import ProposalCreate
 from roles import require_authenticated, require_admin
 from routes.cards import can_view_card
+from study_cache import queue_cache, card_scope
+import label_counts
 
 router = APIRouter()
 
@@ -93,13 +95,16 @@ def accept_proposal(proposal_id: str, db: Session = Depends(get_db), payload=Dep
     if not card:
         raise HTTPException(status_code=400, detail="Card no longer exists")
 
+    before = card_scope(card)
     card.front = proposal.front
     card.back = proposal.back
+    label_counts.adjust(db, removed=[card.labels], added=[proposal.labels])
     card.labels = list(proposal.labels or [])
     proposal.status = "accepted"
     proposal.reviewed_at = datetime.utcnow()
     proposal.reviewed_by = payload["user_id"]
     db.commit()
+    queue_cache.cards_changed([before], [card_scope(card)])
     return {"message": "Proposal accepted"}
 
 
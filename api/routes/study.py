@@ -1,20 +1,36 @@
-from datetime import datetime
+import hashlib
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List
 
 from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy import select, or_, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from database import get_db
-from db_models import Card, Progress
-from models import ReviewRequest
+from db_models import Card, Progress, ReviewReceipt
+from models import ReviewRequest, BatchReviewRequest
+from rate_limit import rate_limit
+from read_routing import get_read_db
 from roles import require_authenticated
-from routes.cards import _serialize_card, can_view_card, label_match
+from routes.cards import (
+    _serialize_card, _visible_cards_stmt, can_view_card, labels_match_any, untracked_by,
+    invalidate_summary,
+)
+from study_cache import queue_cache, scope_hash, card_scope, NEW_SAMPLE_SIZE
 import scheduler
 
 router = APIRouter()
 
 
+def _fsrs_state(p: Progress) -> Optional[dict]:
+    """The stored FSRS state of a progress row, in scheduler.review's shape."""
+    if p.fsrs_state is None:
+        return None
+    return {**{f: getattr(p, f) for f in scheduler.STATE_FIELDS}, "due": p.due}
+
+
 def _deck_id_list(deck_ids: Optional[str]):
     """Parse a comma-separated deck_ids param into a list, or None for 'all'."""
     if not deck_ids:
@@ -36,62 +52,49 @@ def study_queue(limit: int = 20, deck_id: Optional[str] = None,
     Spans the given decks (comma-separated deck_ids, or single deck_id; omit for
     all) and, if `labels` is given, only cards carrying one of those labels. The
     label filter is applied *before* the new-card cap so chapter-scoped study
-    doesn't starve behind unrelated new cards."""
+    doesn't starve behind unrelated new cards.
+
+    The queue is materialized per (user, scope) in Redis on first request and
+    kept current by writes, so repeat polls only read the next batch."""
     user_id = payload["user_id"]
     now = scheduler.now_utc()
     decks = _deck_id_list(deck_ids) or ([deck_id] if deck_id else None)
-    # OR across labels: a card matches if it carries any selected label
-    # (case-insensitive, via label_match).
-    label_filter = or_(*[label_match(l) for l in labels]) if labels else None
 
-    queue = []
+    scope = scope_hash(decks, labels)
+    cached = queue_cache.load(user_id, scope, now, limit)
+    if cached is None:
+        rows = _materialize_queue(db, user_id, decks, labels, limit)
+        queue_cache.store(user_id, scope, decks, labels, *rows)
+        cached = _materialized(*rows, now)
+    new_ids = cached["new"][:max(limit, 0)]
+    due_ids = cached["due"]
 
-    # 1) New cards (no progress yet), shuffled — these go first, capped at `limit`.
-    tracked = set(db.scalars(
-        select(Progress.card_id).where(Progress.user_id == user_id)
-    ))
-    new_conds = [or_(Card.owner_id.is_(None), Card.owner_id == user_id)]
-    if decks is not None:
-        new_conds.append(Card.deck_id.in_(decks))
-    if label_filter is not None:
-        new_conds.append(label_filter)
-    if tracked:
-        new_conds.append(Card.id.not_in(tracked))
+    # One fetch for every card in this batch, plus progress for the due ones.
+    ids = new_ids + due_ids
+    cards_by_id = {c.id: c for c in db.scalars(select(Card).where(Card.id.in_(ids)))} if ids else {}
+    progress_by_card = {p.card_id: p for p in db.scalars(
+        select(Progress).where(Progress.user_id == user_id, Progress.card_id.in_(due_ids))
+    )} if due_ids else {}
+    return _build_queue(new_ids, due_ids, cards_by_id, progress_by_card, cached["new_available"])
 
-    # Total untouched new cards in scope — lets the client offer "introduce more"
-    # instead of falsely reporting "all caught up" when the cap held some back.
-    new_available = db.scalar(select(func.count()).select_from(Card).where(*new_conds))
 
-    new_stmt = select(Card).where(*new_conds).order_by(func.random()).limit(limit)
+def _build_queue(new_ids, due_ids, cards_by_id, progress_by_card, new_available: int) -> dict:
+    """The study_queue response from the batch's ids and their loaded rows."""
+    queue = []
+    # 1) New cards (no progress yet), shuffled — these go first, capped at `limit`.
     new_count = 0
-    for card in db.scalars(new_stmt):
-        queue.append(_serialize_card(card, None, include_progress=True))
-        new_count += 1
-
+    for cid in new_ids:
+        card = cards_by_id.get(cid)
+        if card:
+            queue.append(_serialize_card(card, None, include_progress=True))
+            new_count += 1
     # 2) Due cards (scheduled and due now), most-overdue first — always appended.
-    due_stmt = (
-        select(Progress)
-        .join(Card, Card.id == Progress.card_id)
-        .where(Progress.user_id == user_id,
-               Progress.due.is_not(None),
-               Progress.due <= now)
-        .order_by(Progress.due.asc())
-    )
-    if decks is not None:
-        due_stmt = due_stmt.where(Card.deck_id.in_(decks))
-    if label_filter is not None:
-        due_stmt = due_stmt.where(label_filter)
-    due_progress = list(db.scalars(due_stmt))
     due_count = 0
-    if due_progress:
-        ids = [p.card_id for p in due_progress]
-        cards_by_id = {c.id: c for c in db.scalars(select(Card).where(Card.id.in_(ids)))}
-        pbc = {p.card_id: p for p in due_progress}
-        for cid in ids:
-            card = cards_by_id.get(cid)
-            if card:
-                queue.append(_serialize_card(card, pbc[cid], include_progress=True))
-                due_count += 1
+    for cid in due_ids:
+        card = cards_by_id.get(cid)
+        if card and cid in progress_by_card:
+            queue.append(_serialize_card(card, progress_by_card[cid], include_progress=True))
+            due_count += 1
 
     return {
         "queue": queue,
@@ -103,9 +106,56 @@ def study_queue(limit: int = 20, deck_id: Optional[str] = None,
     }
 
 
+def _materialize_queue(db: Session, user_id: str, decks, labels, limit: int) -> tuple:
+    """Compute a scope's queue from Postgres: (new_ids, new_available, tracked).
+    The caller caches it with QueueCache.store (see study_cache.py) and reads
+    the first batch through _materialized."""
+    # OR across labels: a card matches if it carries any selected label
+    # (case-insensitive, via the lower_labels GIN index).
+    label_filter = labels_match_any(labels) if labels else None
+
+    new_conds = [or_(Card.owner_id.is_(None), Card.owner_id == user_id),
+                 untracked_by(user_id)]
+    if decks is not None:
+        new_conds.append(Card.deck_id.in_(decks))
+    if label_filter is not None:
+        new_conds.append(label_filter)
+
+    # A shuffled sample of untouched cards, deep enough to serve several
+    # batches, plus the total in scope — lets the client offer "introduce more"
+    # instead of falsely reporting "all caught up" when the cap held some back.
+    # The window count is evaluated before LIMIT, so both come back in one trip.
+    rows = db.execute(
+        select(Card.id, func.count().over().label("new_available"))
+        .where(*new_conds).order_by(func.random())
+        .limit(max(limit, NEW_SAMPLE_SIZE))
+    ).all()
+    new_ids = [r.id for r in rows]
+    new_available = rows[0].new_available if rows else 0
+
+    # Every tracked card in scope with its due date; the cache orders them.
+    tracked_stmt = (
+        select(Progress.card_id, Progress.due)
+        .join(Card, Card.id == Progress.card_id)
+        .where(Progress.user_id == user_id)
+    )
+    if decks is not None:
+        tracked_stmt = tracked_stmt.where(Card.deck_id.in_(decks))
+    if label_filter is not None:
+        tracked_stmt = tracked_stmt.where(label_filter)
+    return new_ids, new_available, db.execute(tracked_stmt).all()
+
+
+def _materialized(new_ids, new_available: int, tracked, now) -> dict:
+    """_materialize_queue's rows in the same shape as QueueCache.load."""
+    due = sorted((t for t in tracked if t.due is not None and t.due <= now),
+                 key=lambda t: t.due)
+    return {"new": new_ids, "due": [t.card_id for t in due], "new_available": new_available}
+
+
 @router.get("/study/marked")
 def marked_cards(deck_id: Optional[str] = None, deck_ids: Optional[str] = None,
-                 db: Session = Depends(get_db),
+                 db: Session = Depends(get_read_db),
                  payload=Depends(require_authenticated)):
     """The caller's starred (flagged) cards, optionally scoped to deck(s)."""
     user_id = payload["user_id"]
@@ -129,7 +179,10 @@ def marked_cards(deck_id: Optional[str] = None, deck_ids: Optional[str] = None,
     }
 
 
-@router.post("/cards/{card_id}/review")
+@router.post(
+    "/cards/{card_id}/review",
+    dependencies=[Depends(rate_limit("review", limit=600, window_seconds=60, user_limit=120))],
+)
 def review_card(card_id: str, review: ReviewRequest, db: Session = Depends(get_db),
                 payload=Depends(require_authenticated)):
     """Grade a card (again|hard|good|easy) and advance its FSRS schedule."""
@@ -143,21 +196,202 @@ def review_card(card_id: str, review: ReviewRequest, db: Session = Depends(get_d
         progress = Progress(user_id=user_id, card_id=card_id)
         db.add(progress)
 
+    due, status = _apply_review(progress, review.rating)
+
+    scope = card_scope(card)
+    db.commit()
+    invalidate_summary(user_id)
+    queue_cache.track(user_id, [scope], [due])
+    return {
+        "message": "Review recorded",
+        "due": due.isoformat(),
+        "status": status,
+        "review_count": progress.review_count,
+    }
+
+
+def _apply_review(progress: Progress, rating: str):
+    """Advance a progress row's FSRS schedule in place (400 on a bad rating).
+    Returns the new (due, status)."""
     try:
-        fsrs_card, due, status = scheduler.review(progress.fsrs_card, review.rating)
+        fields, due, status = scheduler.review(_fsrs_state(progress), rating)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    progress.fsrs_card = fsrs_card
+    for name, value in fields.items():
+        setattr(progress, name, value)
     progress.due = due
     progress.status = status
     progress.last_reviewed = datetime.utcnow()
     progress.review_count = (progress.review_count or 0) + 1
+    return due, status
 
-    db.commit()
+
+# Client clocks drift; a reviewed_at slightly ahead of ours is still accepted.
+_CLOCK_SKEW = timedelta(minutes=5)
+
+
+def _idempotency_key(event, reviewed_at: datetime) -> str:
+    if event.idempotency_key:
+        return event.idempotency_key
+    raw = f"{event.card_id}|{reviewed_at.isoformat()}|{event.rating}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def _receipt_result(r: ReviewReceipt, duplicate: bool) -> dict:
     return {
-        "message": "Review recorded",
-        "due": due.isoformat(),
-        "status": status,
-        "review_count": progress.review_count,
+        "idempotency_key": r.idempotency_key,
+        "card_id": r.card_id,
+        "ok": True,
+        "duplicate": duplicate,
+        "due": r.due.isoformat(),
+        "status": r.status,
+        "review_count": r.review_count,
+    }
+
+
+# The receipts' primary key: violating it means a concurrent request applied
+# the same events first.
+_RECEIPT_KEY = "review_receipts_pkey"
+
+
+def _violated_constraint(e: IntegrityError) -> Optional[str]:
+    diag = getattr(e.orig, "diag", None)
+    return getattr(diag, "constraint_name", None)
+
+
+def _plan_reviews(user_id: str, events, applied: dict, visible: dict, seed: dict, now):
+    """Run a batch's events through FSRS in order, without writing anything.
+    `applied` maps the idempotency keys of earlier receipts to their results.
+    Returns (per-event results, new receipts, per-card final state)."""
+    state = {cid: dict(cur) for cid, cur in seed.items()}
+    results = []
+    new_receipts = []
+    batch_keys = set()
+    for event, at, key in events:
+        if key in applied:
+            results.append(applied[key])
+            continue
+        error = None
+        if key in batch_keys:
+            error = "Duplicate idempotency key in batch"
+        elif event.card_id not in visible:
+            error = "Card not found"
+        elif at > now + _CLOCK_SKEW:
+            error = "reviewed_at is in the future"
+        if error is None:
+            cur = state.setdefault(event.card_id, {"fsrs": None, "review_count": 0})
+            try:
+                fields, due, status = scheduler.review(cur["fsrs"], event.rating, at)
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            results.append({"idempotency_key": key, "card_id": event.card_id,
+                            "ok": False, "error": error})
+            continue
+        cur.update(fsrs={**fields, "due": due}, due=due, status=status,
+                   review_count=cur["review_count"] + 1,
+                   last_reviewed=at.astimezone(timezone.utc).replace(tzinfo=None))
+        batch_keys.add(key)
+        receipt = ReviewReceipt(
+            user_id=user_id, idempotency_key=key, card_id=event.card_id,
+            rating=event.rating.lower(), reviewed_at=at, due=due, status=status,
+            review_count=cur["review_count"],
+        )
+        new_receipts.append(receipt)
+        results.append(_receipt_result(receipt, duplicate=False))
+    return results, new_receipts, state
+
+
+@router.post(
+    "/study/reviews",
+    dependencies=[Depends(rate_limit("reviews", limit=120, window_seconds=60, user_limit=30))],
+)
+def review_cards(body: BatchReviewRequest, db: Session = Depends(get_db),
+                 payload=Depends(require_authenticated)):
+    """Grade many cards in one call — for offline study or fast sessions.
+
+    Events are applied in the order given (several events for one card chain
+    through FSRS). Visibility is checked for every card in one query, and all
+    progress rows are upserted in one statement inside a single transaction.
+    Each event gets its own result: a bad rating or unknown card fails just
+    that event. Every accepted event leaves a receipt under its idempotency
+    key, so resubmitting a batch after a timeout returns the original results
+    (`duplicate: true`) instead of reviewing twice."""
+    user_id = payload["user_id"]
+    now = scheduler.now_utc()
+    events = []
+    for e in body.reviews:
+        at = e.reviewed_at or now
+        if at.tzinfo is None:
+            at = at.replace(tzinfo=timezone.utc)
+        events.append((e, at, _idempotency_key(e, at)))
+
+    keys = [k for _, _, k in events]
+    # Results of already-applied events, built now: the rows would expire if
+    # the write below has to roll back and retry.
+    applied = {r.idempotency_key: _receipt_result(r, duplicate=True) for r in db.scalars(
+        select(ReviewReceipt).where(ReviewReceipt.user_id == user_id,
+                                    ReviewReceipt.idempotency_key.in_(keys))
+    )} if keys else {}
+
+    card_ids = {e.card_id for e, _, _ in events}
+    visible = {c.id: c for c in db.execute(_visible_cards_stmt(
+        select(Card.id, Card.deck_id, Card.owner_id, Card.labels)
+        .where(Card.id.in_(card_ids)), payload
+    ))} if card_ids else {}
+    # Per-card running state, seeded from the stored progress rows.
+    seed = {
+        p.card_id: {"fsrs": _fsrs_state(p), "review_count": p.review_count or 0}
+        for p in db.scalars(select(Progress).where(Progress.user_id == user_id,
+                                                   Progress.card_id.in_(list(visible))))
+    } if visible else {}
+
+    while True:
+        results, new_receipts, state = _plan_reviews(user_id, events, applied, visible,
+                                                     seed, now)
+        touched = {r.card_id for r in new_receipts}
+        if not touched:
+            break
+        rows = [{
+            "user_id": user_id, "card_id": cid, "notes": "", "flagged": False,
+            **{f: state[cid]["fsrs"][f] for f in scheduler.STATE_FIELDS},
+            "due": state[cid]["due"],
+            "status": state[cid]["status"], "review_count": state[cid]["review_count"],
+            "last_reviewed": state[cid]["last_reviewed"],
+        } for cid in touched]
+        stmt = insert(Progress).values(rows)
+        try:
+            # Notes and the star belong to the user; a review never overwrites them.
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[Progress.user_id, Progress.card_id],
+                set_={col: stmt.excluded[col] for col in
+                      (*scheduler.STATE_FIELDS, "due", "status", "review_count", "last_reviewed")},
+            ))
+            db.add_all(new_receipts)
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            if _violated_constraint(e) == _RECEIPT_KEY:
+                # A concurrent retry of the same batch committed first.
+                raise HTTPException(status_code=409, detail="Batch is already being applied; retry")
+            # Otherwise a card was deleted since we checked: fail just its
+            # events and apply the rest.
+            remaining = set(db.scalars(select(Card.id).where(Card.id.in_(touched))))
+            if remaining == touched:
+                raise
+            visible = {cid: c for cid, c in visible.items() if cid not in touched - remaining}
+            continue
+        invalidate_summary(user_id)
+        queue_cache.track(
+            user_id,
+            [card_scope(visible[cid]) for cid in touched],
+            [state[cid]["due"] for cid in touched],
+        )
+        break
+
+    return {
+        "results": results,
+        "applied": len(new_receipts),
+        "failed": sum(1 for r in results if not r["ok"]),
     }
@@ -1,11 +1,13 @@
 """Spaced-repetition scheduling, backed by the FSRS algorithm (py-fsrs).
 
-We persist the FSRS card state as a JSON blob on the Progress row plus a
-separate `due` timestamp for efficient "what's due now" queries. This wrapper
-is the only place that imports `fsrs`, so swapping algorithms later is local.
+We persist the FSRS card state as typed columns on the Progress row (see
+STATE_FIELDS) next to the indexed `due` timestamp, so queries can filter on
+stability/difficulty directly and a review never round-trips JSON. This
+wrapper is the only place that imports `fsrs`, so swapping algorithms later is
+local.
 """
 from datetime import datetime, timezone
-from typing import Optional, Tuple
+from typing import Mapping, Optional, Tuple
 
 from fsrs import Scheduler, Card, Rating, State
 
@@ -29,6 +31,9 @@ _STATUS_BY_STATE = {
 
 VALID_RATINGS = tuple(_RATING_BY_NAME.keys())
 
+# Progress columns holding the FSRS card state (alongside `due`).
+STATE_FIELDS = ("fsrs_state", "fsrs_step", "stability", "difficulty", "fsrs_last_review")
+
 
 def parse_rating(name: str) -> Rating:
     try:
@@ -41,20 +46,41 @@ def now_utc() -> datetime:
     return datetime.now(timezone.utc)
 
 
-def _load_card(fsrs_card: Optional[dict]) -> Card:
-    """Rebuild an FSRS Card from stored JSON, or start a fresh one."""
-    if fsrs_card:
-        return Card.from_dict(fsrs_card)
-    return Card()
+def _load_card(state: Optional[Mapping]) -> Card:
+    """Build an FSRS Card from stored state columns, or start a fresh one.
+
+    card_id is irrelevant to scheduling; passing one skips fsrs's id generation
+    (which sleeps 1ms per card to keep generated ids unique)."""
+    if state and state.get("fsrs_state") is not None:
+        return Card(
+            card_id=0,
+            state=State(state["fsrs_state"]),
+            step=state.get("fsrs_step"),
+            stability=state.get("stability"),
+            difficulty=state.get("difficulty"),
+            due=state.get("due"),
+            last_review=state.get("fsrs_last_review"),
+        )
+    return Card(card_id=0)
 
 
-def review(fsrs_card: Optional[dict], rating_name: str) -> Tuple[dict, datetime, str]:
-    """Apply a review.
+def review(state: Optional[Mapping], rating_name: str,
+           reviewed_at: Optional[datetime] = None) -> Tuple[dict, datetime, str]:
+    """Apply a review, as of `reviewed_at` (an aware datetime; default now).
 
-    Returns (new_fsrs_card_json, next_due_utc, derived_status).
+    `state` maps STATE_FIELDS (+ "due") to their stored values, or is None for
+    a card never reviewed. Returns (new_state_fields, next_due_utc,
+    derived_status); the caller writes the fields back onto its row.
     """
-    card = _load_card(fsrs_card)
+    card = _load_card(state)
     rating = parse_rating(rating_name)
-    card, _log = _scheduler.review_card(card, rating, review_datetime=now_utc())
+    card, _log = _scheduler.review_card(card, rating, review_datetime=reviewed_at or now_utc())
     status = _STATUS_BY_STATE.get(card.state, "review")
-    return card.to_dict(), card.due, status
+    fields = {
+        "fsrs_state": card.state.value,
+        "fsrs_step": card.step,
+        "stability": card.stability,
+        "difficulty": card.difficulty,
+        "fsrs_last_review": card.last_review,
+    }
+    return fields, card.due, status
@@ -12,7 +12,7 @@ import sys
 
 from database import SessionLocal
 from db_models import User
-from jwt_utils import hash_password
+from password_pool import password_pool
 from user_manager import user_manager
 
 
@@ -37,7 +37,7 @@ def main() -> int:
 
         admin = User(
             email=email,
-            hashed_password=hash_password(password),
+            hashed_password=password_pool.hash(password),
             roles=["user", "admin"],
             is_active=True,
         )
@@ -1,11 +1,29 @@
 from redis_client import r0
+from config import SESSION_ACTIVITY_WRITE_INTERVAL_SECONDS, SESSION_ACTIVITY_CACHE_SIZE
+from collections import OrderedDict
 from datetime import datetime
+import sys
+import threading
+import time
 import uuid
-from typing import Optional
+from typing import Iterable, List, Optional
+
+# Sessions live as long as the refresh token.
+SESSION_TTL_SECONDS = 7 * 24 * 60 * 60
 
 class SessionManager:
-    def __init__(self, redis_client):
+    def __init__(self, redis_client, activity_interval: float = SESSION_ACTIVITY_WRITE_INTERVAL_SECONDS,
+                 activity_cache_size: int = SESSION_ACTIVITY_CACHE_SIZE):
         self.redis = redis_client
+        # Debounce for update_session_activity: session_id -> monotonic time of
+        # our last write, oldest first. Sync routes run in a threadpool, hence
+        # the lock.
+        self.activity_interval = activity_interval
+        self.activity_cache_size = activity_cache_size
+        self._activity = OrderedDict()
+        self._activity_lock = threading.Lock()
+        self.activity_writes = 0
+        self.activity_skipped = 0
     
     def create_session(self, user_id: str, email: str, roles: list, authenticated: bool = False) -> str:
         """Create a new session"""
@@ -22,19 +40,53 @@ class SessionManager:
             "last_activity": datetime.utcnow().isoformat()
         }
         
-        self.redis.hset(session_key, mapping=session_data)
-        
-        # Set session expiry (7 days for refresh token validity)
-        self.redis.expire(session_key, 604800)
+        # The session plus its entry in the owner's index, whose TTL tracks the
+        # newest session in it.
+        user_key = self._user_key(user_id)
+        pipe = self.redis.pipeline()
+        pipe.hset(session_key, mapping=session_data)
+        pipe.expire(session_key, SESSION_TTL_SECONDS)
+        pipe.sadd(user_key, session_id)
+        pipe.expire(user_key, SESSION_TTL_SECONDS)
+        pipe.execute()
         
         return session_id
     
+    @staticmethod
+    def _user_key(user_id: str) -> str:
+        return f"user_sessions:{user_id}"
+
     def get_session(self, session_id: str) -> Optional[dict]:
         """Get session data"""
         session_key = f"session:{session_id}"
-        session_data = self.redis.hgetall(session_key)
-        
-        if not session_data:
+        return self._parse(self.redis.hgetall(session_key))
+
+    def get_sessions(self, session_ids: Iterable[str]) -> List[Optional[dict]]:
+        """Bulk get_session: one pipelined round trip. None for ids that have
+        expired or were invalidated."""
+        session_ids = list(session_ids)
+        if not session_ids:
+            return []
+        pipe = self.redis.pipeline(transaction=False)
+        for session_id in session_ids:
+            pipe.hgetall(f"session:{session_id}")
+        return [self._parse(data) for data in pipe.execute()]
+
+    def get_user_sessions(self, user_id: str) -> List[dict]:
+        """A user's live sessions, via their index. Ids whose session has
+        expired are pruned from the index on the way."""
+        session_ids = sorted(self.redis.smembers(self._user_key(user_id)))
+        sessions = self.get_sessions(session_ids)
+        stale = [sid for sid, data in zip(session_ids, sessions) if data is None]
+        if stale:
+            self.redis.srem(self._user_key(user_id), *stale)
+        return [data for data in sessions if data is not None]
+
+    @staticmethod
+    def _parse(session_data: dict) -> Optional[dict]:
+        # A hash holding only last_activity is the remnant of an activity write
+        # racing an invalidation; treat it as gone.
+        if not session_data or "session_id" not in session_data:
             return None
         
         return {
@@ -48,24 +100,96 @@ class SessionManager:
         }
     
     def update_session_activity(self, session_id: str):
-        """Update session's last activity"""
+        """Update session's last activity. Called on every request, so it only
+        writes when this process hasn't written it in the last
+        activity_interval seconds — last_activity is accurate to that."""
+        now = time.monotonic()
+        with self._activity_lock:
+            last = self._activity.get(session_id)
+            if last is not None and now - last < self.activity_interval:
+                self._activity.move_to_end(session_id)
+                self.activity_skipped += 1
+                return
+            self._activity[session_id] = now
+            self._activity.move_to_end(session_id)
+            if len(self._activity) > self.activity_cache_size:
+                self._activity.popitem(last=False)
+            self.activity_writes += 1
         session_key = f"session:{session_id}"
         self.redis.hset(session_key, "last_activity", datetime.utcnow().isoformat())
+
+    def activity_stats(self) -> dict:
+        """This process's last_activity write counters."""
+        with self._activity_lock:
+            return {
+                "writes": self.activity_writes,
+                "skipped": self.activity_skipped,
+                "tracked_sessions": len(self._activity),
+                "interval_seconds": self.activity_interval,
+            }
     
     def invalidate_session(self, session_id: str):
         """Invalidate a session"""
         session_key = f"session:{session_id}"
-        self.redis.delete(session_key)
+        user_id = self.redis.hget(session_key, "user_id")
+        pipe = self.redis.pipeline()
+        pipe.delete(session_key)
+        if user_id:
+            pipe.srem(self._user_key(user_id), session_id)
+        pipe.execute()
+        with self._activity_lock:
+            self._activity.pop(session_id, None)
     
     def invalidate_user_sessions(self, user_id: str):
-        """Invalidate all sessions for a user"""
-        # This would require indexing sessions by user_id
-        # For now, we'll implement a simple approach
-        keys = self.redis.keys("session:*")
-        for key in keys:
-            session_data = self.redis.hgetall(key)
-            if session_data.get("user_id") == user_id:
-                self.redis.delete(key)
+        """Invalidate all sessions for a user: O(that user's sessions), via
+        the user_sessions:{user_id} index."""
+        user_key = self._user_key(user_id)
+        session_ids = list(self.redis.smembers(user_key))
+        pipe = self.redis.pipeline()
+        for session_id in session_ids:
+            pipe.delete(f"session:{session_id}")
+        pipe.delete(user_key)
+        pipe.execute()
+        with self._activity_lock:
+            for session_id in session_ids:
+                self._activity.pop(session_id, None)
+
+    def rebuild_user_index(self) -> int:
+        """Index every live session under its user (for sessions created
+        before the index existed). SCANs, so it doesn't block Redis; safe to
+        run while serving. Returns the number of sessions indexed."""
+        indexed = 0
+        for keys in self._scan_batches("session:*"):
+            pipe = self.redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.hget(key, "user_id")
+            pipe2 = self.redis.pipeline(transaction=False)
+            for key, user_id in zip(keys, pipe.execute()):
+                if user_id:
+                    pipe2.sadd(self._user_key(user_id), key.split(":", 1)[1])
+                    pipe2.expire(self._user_key(user_id), SESSION_TTL_SECONDS)
+                    indexed += 1
+            pipe2.execute()
+        return indexed
+
+    def _scan_batches(self, match: str, count: int = 500):
+        cursor = 0
+        while True:
+            cursor, keys = self.redis.scan(cursor=cursor, match=match, count=count)
+            if keys:
+                yield keys
+            if cursor == 0:
+                break
 
 # Initialize session manager
 session_manager = SessionManager(r0)
+
+
+def main() -> int:
+    """Backfill the per-user session index:  python session_manager.py"""
+    print(f"Indexed {session_manager.rebuild_user_index()} session(s).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
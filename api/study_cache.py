@@ -0,0 +1,360 @@
+"""Per-user materialized study queues, cached in Redis (db0).
+
+`/study/queue` is polled repeatedly during a session, and rebuilding it means a
+new-card count, a random sample and a due-card join every time. Instead the
+first call for a (user, deck/label scope) materializes the queue here:
+
+    studyq:{user}:{scope}:meta  hash  new_available, decks, labels (the scope)
+    studyq:{user}:{scope}:new   list  a shuffled sample of untouched card ids
+    studyq:{user}:{scope}:due   zset  every tracked card in scope -> due epoch
+                                      (+inf when tracked but unscheduled)
+
+and later calls are an O(batch) read. Writes keep the cached queues current
+incrementally rather than dropping them: a review moves one card from `new` to
+`due` in that user's queues, and card/deck mutations add or remove just the
+affected ids in the live queues whose scope they touch. To find those without
+visiting every queue, each queue is also listed under its decks:
+
+    studyq:deck:{deck_id}  set  "{user}:{scope}" of queues scoped to that deck
+    studyq:deck:*          set  ... of queues spanning all decks
+
+so a card change reads only the queues indexed under its old/new deck (and
+only its owner's, for a private card), in a fixed number of pipelined round
+trips. Keys carry a TTL as a safety net against any drift; `store` only
+creates `new`/`due` when non-empty, so writes that may create one give it the
+meta key's remaining TTL. Index entries of expired queues are pruned when next
+read.
+
+Like the rate limiter, every operation fails open: on a Redis error the caller
+falls back to computing the queue from Postgres.
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from redis_client import r0
+
+# How long an idle materialized queue lives before it's rebuilt from scratch.
+QUEUE_TTL_SECONDS = 15 * 60
+# Untouched card ids kept per queue; a request for more rebuilds with a larger
+# sample.
+NEW_SAMPLE_SIZE = 200
+# Above this many changed cards in one mutation (bulk import, deck wipe) we drop
+# the live queues instead of patching each one card by card.
+MAX_INCREMENTAL_CARDS = 1000
+
+_ACTIVE_KEY = "studyq:active"
+_ALL_DECKS = "*"
+
+
+def _deck_key(deck_id: str) -> str:
+    return f"studyq:deck:{deck_id}"
+
+
+def scope_hash(decks: Optional[List[str]], labels: Optional[List[str]]) -> str:
+    """Stable key for a deck/label scope. Labels match case-insensitively, so
+    they're folded before hashing."""
+    scope = {
+        "d": sorted(set(decks)) if decks is not None else None,
+        "l": sorted({l.lower() for l in labels}) if labels else None,
+    }
+    return hashlib.sha1(json.dumps(scope, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def card_scope(card) -> dict:
+    """The fields of a card that decide which queues it belongs to."""
+    return {
+        "id": card.id,
+        "deck_id": card.deck_id,
+        "owner_id": card.owner_id,
+        "labels": list(card.labels or []),
+    }
+
+
+def _score(due: Optional[datetime]) -> float:
+    return due.timestamp() if due is not None else float("inf")
+
+
+class QueueCache:
+    def __init__(self, redis_client):
+        self.redis = redis_client
+
+    @staticmethod
+    def _key(user_id: str, scope: str, part: str) -> str:
+        return f"studyq:{user_id}:{scope}:{part}"
+
+    @staticmethod
+    def _user_key(user_id: str) -> str:
+        return f"studyq:user:{user_id}"
+
+    @staticmethod
+    def _in_scope(meta: dict, user_id: str, card: Optional[dict]) -> bool:
+        """Whether `card` (a card_scope dict) belongs in a queue with this meta.
+        Mirrors the SQL filters in routes/study.py: visible to the user, in one
+        of the scoped decks, carrying one of the scoped labels."""
+        if card is None:
+            return False
+        if card["owner_id"] is not None and card["owner_id"] != user_id:
+            return False
+        decks = json.loads(meta.get("decks") or "null")
+        if decks is not None and card["deck_id"] not in decks:
+            return False
+        labels = json.loads(meta.get("labels") or "null")
+        if labels and not ({l.lower() for l in card["labels"]} & set(labels)):
+            return False
+        return True
+
+    # --- read / materialize --------------------------------------------------
+
+    def load(self, user_id: str, scope: str, now: datetime, limit: int) -> Optional[dict]:
+        """The cached queue for this scope, or None if it must be (re)built:
+        returns {"new": [ids], "due": [ids most-overdue first], "new_available": n}."""
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hgetall(self._key(user_id, scope, "meta"))
+            pipe.lrange(self._key(user_id, scope, "new"), 0, max(limit, 0) - 1)
+            pipe.llen(self._key(user_id, scope, "new"))
+            pipe.zrangebyscore(self._key(user_id, scope, "due"), "-inf", now.timestamp())
+            meta, new_ids, sample_len, due_ids = pipe.execute()
+        except Exception:
+            return None
+        if not meta:
+            return None
+        new_available = int(meta.get("new_available") or 0)
+        # The sample ran dry but more new cards exist — rebuild a fresh sample.
+        if sample_len < limit and new_available > sample_len:
+            return None
+        return {"new": new_ids if limit > 0 else [], "due": due_ids,
+                "new_available": new_available}
+
+    def store(self, user_id: str, scope: str, decks: Optional[List[str]],
+              labels: Optional[List[str]], new_ids: List[str], new_available: int,
+              tracked: Iterable[tuple]) -> None:
+        """Materialize a queue. `tracked` yields (card_id, due) for every card in
+        scope the user has progress on."""
+        keys = {part: self._key(user_id, scope, part) for part in ("meta", "new", "due")}
+        try:
+            pipe = self.redis.pipeline()
+            pipe.delete(*keys.values())
+            pipe.hset(keys["meta"], mapping={
+                "new_available": new_available,
+                "decks": json.dumps(sorted(set(decks)) if decks is not None else None),
+                "labels": json.dumps(sorted({l.lower() for l in labels}) if labels else None),
+            })
+            if new_ids:
+                pipe.rpush(keys["new"], *new_ids)
+            scores = {card_id: _score(due) for card_id, due in tracked}
+            if scores:
+                pipe.zadd(keys["due"], scores)
+            for key in keys.values():
+                pipe.expire(key, QUEUE_TTL_SECONDS)
+            pipe.sadd(self._user_key(user_id), scope)
+            pipe.expire(self._user_key(user_id), QUEUE_TTL_SECONDS)
+            member = f"{user_id}:{scope}"
+            indexed = sorted(set(decks)) if decks is not None else [_ALL_DECKS]
+            for deck_key in map(_deck_key, indexed):
+                pipe.sadd(deck_key, member)
+                pipe.expire(deck_key, QUEUE_TTL_SECONDS)
+            pipe.sadd(_ACTIVE_KEY, member)
+            pipe.expire(_ACTIVE_KEY, QUEUE_TTL_SECONDS)
+            pipe.execute()
+        except Exception:
+            pass
+
+    # --- incremental maintenance --------------------------------------------
+
+    def _live_scopes(self, user_id: str) -> List[tuple]:
+        """(scope, meta, ttl_ms) for each of the user's queues that still
+        exists; ttl_ms is the meta key's remaining TTL."""
+        scopes = list(self.redis.smembers(self._user_key(user_id)))
+        if not scopes:
+            return []
+        pipe = self.redis.pipeline()
+        for scope in scopes:
+            pipe.hgetall(self._key(user_id, scope, "meta"))
+            pipe.pttl(self._key(user_id, scope, "meta"))
+        replies = pipe.execute()
+        live = []
+        for scope, meta, ttl_ms in zip(scopes, replies[::2], replies[1::2]):
+            if meta:
+                live.append((scope, meta, ttl_ms))
+            else:
+                self.redis.srem(self._user_key(user_id), scope)
+                self.redis.srem(_ACTIVE_KEY, f"{user_id}:{scope}")
+        return live
+
+    def _keep_ttl(self, pipe, user_id: str, scope: str, ttl_ms: int, *parts: str) -> None:
+        """Expire these parts of a queue with its meta key, in case the write
+        queued on `pipe` is what creates them."""
+        if ttl_ms > 0:
+            for part in parts:
+                pipe.pexpire(self._key(user_id, scope, part), ttl_ms)
+
+    def track(self, user_id: str, cards: List[dict], dues: List[Optional[datetime]]) -> None:
+        """The user now has progress on these cards (a review, or a progress
+        edit): move each from `new` to `due` in the queues it belongs to."""
+        try:
+            for scope, meta, ttl_ms in self._live_scopes(user_id):
+                in_scope = [(c, d) for c, d in zip(cards, dues) if self._in_scope(meta, user_id, c)]
+                if not in_scope:
+                    continue
+                due_key = self._key(user_id, scope, "due")
+                was = self.redis.zmscore(due_key, [c["id"] for c, _ in in_scope])
+                pipe = self.redis.pipeline()
+                newly = 0
+                for (card, due), score in zip(in_scope, was):
+                    if score is None:
+                        newly += 1
+                        pipe.lrem(self._key(user_id, scope, "new"), 0, card["id"])
+                    pipe.zadd(due_key, {card["id"]: _score(due)})
+                if newly:
+                    pipe.hincrby(self._key(user_id, scope, "meta"), "new_available", -newly)
+                self._keep_ttl(pipe, user_id, scope, ttl_ms, "due")
+                pipe.execute()
+        except Exception:
+            self.drop_user(user_id)
+
+    def untrack(self, user_id: str, card: dict) -> None:
+        """The user's progress on `card` was reset: it's new again."""
+        try:
+            for scope, meta, ttl_ms in self._live_scopes(user_id):
+                if not self._in_scope(meta, user_id, card):
+                    continue
+                pipe = self.redis.pipeline()
+                pipe.zrem(self._key(user_id, scope, "due"), card["id"])
+                pipe.rpush(self._key(user_id, scope, "new"), card["id"])
+                pipe.hincrby(self._key(user_id, scope, "meta"), "new_available", 1)
+                self._keep_ttl(pipe, user_id, scope, ttl_ms, "new")
+                pipe.execute()
+        except Exception:
+            self.drop_user(user_id)
+
+    def cards_changed(self, before: List[dict], after: List[Optional[dict]]) -> None:
+        """Cards were created, edited, moved or deleted. `before`/`after` are
+        parallel card_scope lists; use {} in `before` for a created card and None
+        in `after` for a deleted one. Each affected queue gains or loses just the
+        cards whose membership changed."""
+        if not before:
+            return
+        if len(before) > MAX_INCREMENTAL_CARDS:
+            self.drop_all()
+            return
+        try:
+            index_keys, members = self._candidates(before, after)
+            if not members:
+                return
+            pipe = self.redis.pipeline()
+            for member in members:
+                user_id, scope = member.split(":", 1)
+                pipe.hgetall(self._key(user_id, scope, "meta"))
+            pending, stale = [], []
+            for member, meta in zip(members, pipe.execute()):
+                user_id, scope = member.split(":", 1)
+                if not meta:
+                    stale.append(member)
+                    continue
+                changes = self._changes(user_id, meta, before, after)
+                if changes:
+                    pending.append((user_id, scope, changes))
+            if stale:
+                pipe = self.redis.pipeline()
+                for key in index_keys + [_ACTIVE_KEY]:
+                    pipe.srem(key, *stale)
+                pipe.execute()
+            if pending:
+                self._apply_changes(pending)
+        except Exception:
+            self.drop_all()
+
+    def _candidates(self, before, after) -> tuple:
+        """(index keys read, members) for the queues these changes could touch:
+        those listed under the cards' old or new decks, or spanning all decks —
+        narrowed to the owners' own queues when every card is private."""
+        cards = [c for c in list(before) + list(after) if c]
+        index_keys = [_deck_key(_ALL_DECKS)] + [
+            _deck_key(d) for d in sorted({c["deck_id"] for c in cards if c["deck_id"]})
+        ]
+        members = self.redis.sunion(index_keys)
+        owners = {c["owner_id"] for c in cards}
+        if None not in owners:
+            members = {m for m in members if m.split(":", 1)[0] in owners}
+        return index_keys, sorted(members)
+
+    def _changes(self, user_id, meta, before, after) -> list:
+        """(card_id, was_in_scope, now_in_scope) for cards whose membership in
+        this queue changed."""
+        changes = []
+        for old, new in zip(before, after):
+            was = self._in_scope(meta, user_id, old or None)
+            now = self._in_scope(meta, user_id, new)
+            if was != now:
+                changes.append(((old or new)["id"], was, now))
+        return changes
+
+    def _apply_changes(self, pending) -> None:
+        """Patch each (user_id, scope, changes) queue: one pipelined round trip
+        to see which cards are tracked (and the queue's TTL), one to write."""
+        pipe = self.redis.pipeline()
+        for user_id, scope, changes in pending:
+            pipe.zmscore(self._key(user_id, scope, "due"), [cid for cid, _, _ in changes])
+            pipe.pttl(self._key(user_id, scope, "meta"))
+        replies = pipe.execute()
+
+        pipe = self.redis.pipeline()
+        rebuild = []
+        for (user_id, scope, changes), scores, ttl_ms in zip(pending, replies[::2],
+                                                             replies[1::2]):
+            due_key = self._key(user_id, scope, "due")
+            new_key = self._key(user_id, scope, "new")
+            if any(score is not None and now for (_, _, now), score in zip(changes, scores)):
+                # A card the user has progress on moved into scope; we don't
+                # know its due date here, so rebuild this queue next time.
+                rebuild.append((user_id, scope))
+                continue
+            delta = 0
+            for (card_id, was, now), score in zip(changes, scores):
+                if score is not None:
+                    pipe.zrem(due_key, card_id)
+                elif now:
+                    pipe.rpush(new_key, card_id)
+                    delta += 1
+                else:
+                    pipe.lrem(new_key, 0, card_id)
+                    delta -= 1
+            if delta:
+                pipe.hincrby(self._key(user_id, scope, "meta"), "new_available", delta)
+            self._keep_ttl(pipe, user_id, scope, ttl_ms, "new")
+        pipe.execute()
+        for user_id, scope in rebuild:
+            self.drop(user_id, scope)
+
+    # --- invalidation ------------------------------------------------------
+
+    def drop(self, user_id: str, scope: str) -> None:
+        try:
+            self.redis.delete(*(self._key(user_id, scope, p) for p in ("meta", "new", "due")))
+            self.redis.srem(self._user_key(user_id), scope)
+            self.redis.srem(_ACTIVE_KEY, f"{user_id}:{scope}")
+        except Exception:
+            pass
+
+    def drop_user(self, user_id: str) -> None:
+        """Forget every queue for a user (e.g. all their progress was reset)."""
+        try:
+            for scope in self.redis.smembers(self._user_key(user_id)):
+                self.drop(user_id, scope)
+            self.redis.delete(self._user_key(user_id))
+        except Exception:
+            pass
+
+    def drop_all(self) -> None:
+        try:
+            for member in self.redis.smembers(_ACTIVE_KEY):
+                user_id, scope = member.split(":", 1)
+                self.drop(user_id, scope)
+        except Exception:
+            pass
+
+
+queue_cache = QueueCache(r0)
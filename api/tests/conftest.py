@@ -24,12 +24,23 @@ from fastapi.testclient import TestClient  # noqa: E402
 from sqlalchemy import text  # noqa: E402
 
 import main  # noqa: E402
+import database  # noqa: E402
 from database import engine, Base, SessionLocal  # noqa: E402
 import db_models  # noqa: F401,E402  (register models on Base.metadata)
 from db_models import User  # noqa: E402
 from jwt_utils import hash_password  # noqa: E402
 from redis_client import r0  # noqa: E402
 
+if database.AsyncSessionLocal is not None:
+    # ASYNC_DB runs: most clients here are plain TestClients, which start a
+    # fresh event loop per request, and asyncpg connections can't outlive
+    # their loop — so don't pool them.
+    from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+    from sqlalchemy.pool import NullPool  # noqa: E402
+
+    database.AsyncSessionLocal.configure(
+        bind=create_async_engine(database.ASYNC_DATABASE_URL, poolclass=NullPool))
+
 
 @pytest.fixture(scope="session", autouse=True)
 def _schema():
@@ -91,3 +91,167 @@ def test_admin_only_user_list(client, admin, user):
     assert resp.status_code == 200
     # never leak password hashes
     assert all("hashed_password" not in u for u in resp.json()["users"])
+
+
+def test_session_activity_writes_are_debounced(admin):
+    admin.get("/decks")  # first request for this session writes
+    before = admin.get("/admin/metrics").json()["session_activity"]
+    for _ in range(3):
+        admin.get("/decks")
+    after = admin.get("/admin/metrics").json()["session_activity"]
+    # Same session, well inside the interval: every request skipped the write.
+    assert after["skipped"] - before["skipped"] >= 3
+    assert after["writes"] == before["writes"]
+
+
+def test_user_session_index():
+    from redis_client import r0
+    from session_manager import session_manager
+    a1 = session_manager.create_session("u1", "u1@test.com", ["user"], True)
+    a2 = session_manager.create_session("u1", "u1@test.com", ["user"], True)
+    b1 = session_manager.create_session("u2", "u2@test.com", ["user"], True)
+    assert {s["session_id"] for s in session_manager.get_user_sessions("u1")} == {a1, a2}
+
+    session_manager.invalidate_session(a2)
+    assert r0.smembers("user_sessions:u1") == {a1}
+
+    session_manager.invalidate_user_sessions("u1")
+    assert session_manager.get_sessions([a1, a2, b1])[:2] == [None, None]
+    assert not r0.exists("user_sessions:u1")
+    assert [s["session_id"] for s in session_manager.get_user_sessions("u2")] == [b1]
+
+
+def test_rebuild_user_index_backfills_old_sessions():
+    from redis_client import r0
+    from session_manager import session_manager
+    sid = session_manager.create_session("u1", "u1@test.com", ["user"], True)
+    r0.delete("user_sessions:u1")  # as if created before the index existed
+    assert session_manager.rebuild_user_index() == 1
+    assert r0.smembers("user_sessions:u1") == {sid}
+
+
+def test_admin_sessions_paginate(admin):
+    from session_manager import session_manager
+    created = {session_manager.create_session(f"u{i}", f"u{i}@test.com", ["user"], True)
+               for i in range(7)}
+    seen, cursor = [], "0"
+    while cursor is not None:
+        page = admin.get(f"/admin/sessions?limit=2&cursor={cursor}").json()
+        seen += [s["session_id"] for s in page["sessions"]]
+        cursor = page["next_cursor"]
+    assert created <= set(seen)
+    assert len(seen) == len(set(seen)) == 8  # plus the admin's own session
+
+
+def test_admin_sessions_filter_by_email(admin, user):
+    sessions = admin.get("/admin/sessions?email=admin@test.com").json()["sessions"]
+    assert [s["email"] for s in sessions] == ["admin@test.com"]
+    assert admin.get("/admin/sessions?email=nobody@test.com").json()["sessions"] == []
+
+
+def test_rate_limit_token_bucket_per_user_and_ip():
+    from fastapi import Depends, FastAPI
+    from fastapi.testclient import TestClient
+    from jwt_utils import create_access_token
+    from rate_limit import rate_limit
+
+    app = FastAPI()
+
+    @app.get("/limited", dependencies=[Depends(rate_limit("t", limit=5, window_seconds=60,
+                                                          user_limit=2))])
+    def limited():
+        return {}
+
+    c = TestClient(app)
+    for uid in ("a", "b"):
+        c.cookies.set("access_token", create_access_token(uid, f"{uid}@test.com", ["user"], True))
+        codes = [c.get("/limited").status_code for _ in range(3)]
+        assert codes == [200, 200, 429]  # per-user bucket
+    r = c.get("/limited")
+    assert r.status_code == 429 and int(r.headers["Retry-After"]) >= 1
+    # The IP bucket (5) is shared: 4 admitted so far, rejected calls spend nothing.
+    c.cookies.delete("access_token")
+    assert [c.get("/limited").status_code for _ in range(2)] == [200, 429]
+
+
+def test_rate_limit_falls_back_to_local_buckets(monkeypatch):
+    import rate_limit
+    from fastapi import Depends, FastAPI
+    from fastapi.testclient import TestClient
+
+    calls = []
+
+    def redis_down(**kwargs):
+        calls.append(1)
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(rate_limit, "_token_bucket", redis_down)
+    monkeypatch.setattr(rate_limit, "_local", rate_limit._LocalBuckets(100))
+    monkeypatch.setattr(rate_limit, "_breaker", rate_limit._Breaker(2, 60))
+    app = FastAPI()
+
+    @app.get("/limited", dependencies=[Depends(rate_limit.rate_limit("t", limit=3,
+                                                                     window_seconds=60))])
+    def limited():
+        return {}
+
+    c = TestClient(app)
+    before = rate_limit.limiter_stats()
+    assert [c.get("/limited").status_code for _ in range(5)] == [200, 200, 200, 429, 429]
+    # The breaker opened after 2 errors; later checks didn't touch Redis.
+    assert len(calls) == 2
+    stats = rate_limit.limiter_stats()
+    assert stats["breaker"] == "open" and stats["breaker_opens"] == 1
+    assert stats["local_checks"] - before["local_checks"] == 5
+    assert stats["rejected"] - before["rejected"] == 2
+
+
+def test_password_pool_sheds_when_full():
+    import threading
+    import pytest
+    from password_pool import PasswordPool, PasswordPoolBusy
+    pool = PasswordPool(workers=1, max_queue=1)
+    release = threading.Event()
+    running = [pool.submit(release.wait), pool.submit(release.wait)]
+    with pytest.raises(PasswordPoolBusy):
+        pool.submit(release.wait)
+    release.set()
+    for f in running:
+        f.result(timeout=5)
+    assert pool.call(lambda: "ok") == "ok"  # slots are released
+    assert pool.stats()["rejected"] == 1
+
+
+def test_login_returns_503_when_password_pool_busy(admin, client, monkeypatch):
+    from password_pool import PasswordPoolBusy, password_pool
+
+    async def busy(*args):
+        raise PasswordPoolBusy()
+
+    monkeypatch.setattr(password_pool, "verify_async", busy)
+    r = client.post("/auth/login", json={"email": "admin@test.com", "password": "adminpw123"})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+
+
+def test_db_pool_metrics(admin, monkeypatch):
+    import pytest
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    import db_metrics
+    from database import SessionLocal
+
+    monkeypatch.setattr(db_metrics, "DB_SLOW_QUERY_MS", 0)  # every statement is "slow"
+    before = admin.get("/admin/metrics").json()["db"]["primary"]
+    db = SessionLocal()
+    try:
+        db.execute(text("SET LOCAL statement_timeout = 10"))
+        with pytest.raises(OperationalError):
+            db.execute(text("SELECT pg_sleep(1)"))
+    finally:
+        db.close()
+    after = admin.get("/admin/metrics").json()["db"]["primary"]
+    assert after["checkouts"] > before["checkouts"]
+    assert after["slow_queries"] > before["slow_queries"]
+    assert after["statement_timeouts"] == before["statement_timeouts"] + 1
+    assert 0 <= after["saturation"] <= 1
@@ -52,3 +52,130 @@ def test_note_edit_does_not_count_as_review(user, make_card):
     prog = user.get("/cards").json()["cards"][0]["user_progress"]
     assert prog["review_count"] == 0
     assert prog["notes"] == "studying"
+
+
+def _all_pages(c, qs):
+    seen, cursor = [], None
+    while True:
+        url = f"/cards?{qs}" + (f"&cursor={cursor}" if cursor else "")
+        body = c.get(url).json()
+        seen += [card["card_id"] for card in body["cards"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            return seen
+
+
+def test_paginated_list_covers_every_card_once(admin, make_card):
+    ids = {make_card(front=f"c{i}") for i in range(7)}
+    seen = _all_pages(admin, "limit=3")
+    assert len(seen) == 7 and set(seen) == ids
+
+
+def test_paginated_order_is_stable(admin, make_card):
+    for i in range(5):
+        make_card(front=f"c{i}")
+    assert _all_pages(admin, "limit=2") == _all_pages(admin, "limit=2")
+
+
+def test_seeded_shuffle_is_reproducible(admin, make_card):
+    ids = {make_card(front=f"c{i}") for i in range(9)}
+    first = _all_pages(admin, "limit=4&shuffle=abc")
+    assert set(first) == ids and len(first) == 9
+    assert _all_pages(admin, "limit=4&shuffle=abc") == first
+    # Another seed is its own permutation, not the same cycle from another start.
+    other = _all_pages(admin, "limit=4&shuffle=xyz")
+    assert set(other) == ids
+    assert all(other != first[i:] + first[:i] for i in range(len(first)))
+
+
+def test_unpaged_list_has_no_cursor(admin, make_card):
+    make_card()
+    assert "next_cursor" not in admin.get("/cards").json()
+
+
+def test_bad_cursor_400(admin):
+    assert admin.get("/cards?limit=2&cursor=not-a-cursor").status_code == 400
+    # Well-formed JSON, but an id that isn't a string.
+    from routes.cards import _encode_cursor
+    bad = _encode_cursor({"c": "2026-01-01T00:00:00", "i": 1})
+    assert admin.get(f"/cards?limit=2&cursor={bad}").status_code == 400
+
+
+def test_label_filter_is_case_insensitive_and_literal(admin, make_card):
+    make_card(front="a", labels=["Ch_1"])
+    make_card(front="b", labels=["chx1"])   # would match if '_' were a wildcard
+    make_card(front="c", labels=["100%"])
+    make_card(front="d", labels=["1000"])
+    assert [c["front"] for c in admin.get("/cards?label=ch_1").json()["cards"]] == ["a"]
+    assert [c["front"] for c in admin.get("/cards?label=100%25").json()["cards"]] == ["c"]
+
+
+def test_labels_counts_fold_case(admin, make_card):
+    make_card(labels=["Verb"])
+    make_card(labels=["verb"])
+    make_card(labels=["verb"])
+    labels = {l["label"]: l["card_count"] for l in admin.get("/labels").json()["labels"]}
+    assert labels == {"verb": 3}
+
+
+def test_label_counts_follow_edits_and_deletes(admin, make_card):
+    a = make_card(labels=["x", "y"])
+    make_card(labels=["x"])
+    admin.put(f"/cards/{a}", json={"labels": ["y", "z"]})
+    labels = {l["label"]: l["card_count"] for l in admin.get("/labels").json()["labels"]}
+    assert labels == {"x": 1, "y": 1, "z": 1}
+    admin.delete(f"/cards/{a}")
+    labels = {l["label"]: l["card_count"] for l in admin.get("/labels").json()["labels"]}
+    assert labels == {"x": 1}
+
+
+def test_labels_etag_revalidates(client, make_card):
+    make_card(labels=["a"])
+    r = client.get("/labels")
+    etag = r.headers["etag"]
+    assert client.get("/labels", headers={"If-None-Match": etag}).status_code == 304
+    make_card(labels=["b"])
+    assert client.get("/labels", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_label_count_reconcile_repairs_drift(make_card):
+    from sqlalchemy import text
+    from database import SessionLocal
+    import label_counts
+
+    make_card(labels=["a"])
+    make_card(labels=["A", "b"])
+    db = SessionLocal()
+    try:
+        db.execute(text("UPDATE label_counts SET card_count = 7"))
+        db.commit()
+        assert label_counts.reconcile(db) >= 1
+        counts = {l["label"].lower(): l["card_count"] for l in label_counts.read(db)}
+    finally:
+        db.close()
+    assert counts == {"a": 2, "b": 1}
+
+
+def test_by_status_new_pages_through_untouched_cards(user, make_card):
+    ids = {make_card(front=f"c{i}") for i in range(5)}
+    seen = make_card(front="seen")
+    user.post(f"/cards/{seen}/review", json={"rating": "good"})
+    got, cursor = [], None
+    while True:
+        body = user.get("/cards/by-status/new?limit=2" + (f"&cursor={cursor}" if cursor else "")).json()
+        got += [c["card_id"] for c in body["cards"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert sorted(got) == sorted(ids)
+    learning = user.get("/cards/by-status/learning").json()
+    assert [c["card_id"] for c in learning["cards"]] == [seen]
+
+
+def test_by_status_without_limit_is_not_capped(user, make_card, monkeypatch):
+    import routes.cards
+    monkeypatch.setattr(routes.cards, "MAX_PAGE_SIZE", 2)
+    ids = [make_card(front=f"c{i}") for i in range(5)]
+    body = user.get("/cards/by-status/new").json()
+    assert sorted(c["card_id"] for c in body["cards"]) == sorted(ids)
+    assert "next_cursor" not in body
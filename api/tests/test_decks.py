@@ -57,3 +57,31 @@ def test_featured_filter_is_public(client, admin, make_deck, make_card):
     # unauthenticated visitor sees only featured-deck cards
     fronts = [c["front"] for c in client.get("/cards?featured=1").json()["cards"]]
     assert fronts == ["pub"]
+
+
+def test_deck_card_count_follows_moves_and_deletes(admin, make_deck, make_card):
+    a, b = make_deck(name="A"), make_deck(name="B")
+    cid = make_card(deck_id=a)
+    make_card(deck_id=a)
+    admin.put(f"/cards/{cid}", json={"deck_id": b})
+    counts = {d["deck_id"]: d["card_count"] for d in admin.get("/decks").json()["decks"]}
+    assert counts[a] == 1 and counts[b] == 1
+    admin.delete(f"/cards/{cid}")
+    assert admin.get(f"/decks/{b}").json()["deck"]["card_count"] == 0
+
+
+def test_deck_duplicates_clusters_normalized_content(admin, user, make_deck, make_card):
+    deck, other = make_deck(name="A"), make_deck(name="B")
+    first = make_card(front="Café", back="Coffee", deck_id=deck)
+    second = make_card(front="  CAFE\u0301 ", back="coffee", deck_id=deck)  # decomposed É
+    make_card(front="Thé", back="Tea", deck_id=deck)
+    make_card(front="café", back="coffee", deck_id=other)  # other deck: not a dup
+    edited = make_card(front="placeholder", back="x", deck_id=deck)
+    admin.put(f"/cards/{edited}", json={"front": "cafÉ", "back": "COFFEE"})
+
+    r = admin.get(f"/decks/{deck}/duplicates")
+    assert r.status_code == 200
+    clusters = r.json()["clusters"]
+    assert len(clusters) == 1
+    assert [c["card_id"] for c in clusters[0]["cards"]] == [first, second, edited]
+    assert user.get(f"/decks/{deck}/duplicates").status_code == 403
@@ -73,6 +73,154 @@ def test_import_dedup_is_per_deck(admin, make_deck):
     assert r.json() == {"imported": 2, "skipped": 1, "updated": 0}
 
 
+def test_import_spans_batches(admin, make_deck, monkeypatch):
+    import routes.io
+    monkeypatch.setattr(routes.io, "IMPORT_BATCH_ROWS", 2)
+    deck = make_deck()
+    admin.post("/import/cards", json={"format": "json", "content": JSON_PAYLOAD, "deck_id": deck})
+    # Dups of both existing and earlier-batch rows land in later batches.
+    payload = json.dumps({"cards": [
+        {"front": "bonjour", "back": "hello", "labels": ["CH1"]},
+        {"front": "oui", "back": "yes"},
+        {"front": "OUI", "back": "YES"},
+        {"front": "BONJOUR", "back": "hello", "labels": ["CH2"]},
+        {"front": "non", "back": "no"},
+    ]})
+    r = admin.post("/import/cards", json={
+        "format": "json", "content": payload, "deck_id": deck, "update_existing": True,
+    })
+    assert r.json() == {"imported": 2, "updated": 2, "skipped": 1}
+    cards = admin.get(f"/cards?deck_id={deck}&limit=10").json()["cards"]
+    assert [c["front"] for c in cards] == ["bonjour", "merci", "oui", "non"]
+    assert cards[0]["labels"] == ["CH2"]
+    labels = {l["label"]: l["card_count"] for l in admin.get("/labels").json()["labels"]}
+    assert labels["CH2"] == 1 and labels.get("CH1", 0) == 0
+    assert admin.get(f"/decks/{deck}").json()["deck"]["card_count"] == 4
+
+
+def test_import_tells_its_own_cards_from_same_admins_cards(admin, make_deck):
+    # A card the same admin adds by hand mid-import is an existing card, not
+    # a repeat of one this import created.
+    from database import SessionLocal
+    from db_models import Card, User
+    from importer import ImportState, import_batch
+    deck = make_deck()
+    db = SessionLocal()
+    try:
+        admin_id = db.query(User.id).filter(User.email == "admin@test.com").scalar()
+        state = ImportState(deck, admin_id, update_existing=True)
+        import_batch(db, [{"front": "uno", "back": "one"}], state)
+        db.add(Card(front="dos", back="two", labels=["manual"], deck_id=deck,
+                    created_by=admin_id))
+        db.flush()
+        import_batch(db, [{"front": "dos", "back": "two", "labels": ["imported"]},
+                          {"front": "UNO", "back": "one"}], state)
+        assert state.report() == {"imported": 1, "updated": 1, "skipped": 1}
+    finally:
+        db.rollback()
+        db.close()
+
+
+def test_background_import_job(admin, make_deck):
+    import import_worker
+    deck = make_deck()
+    r = admin.post("/import/cards", json={
+        "format": "json", "content": JSON_PAYLOAD, "deck_id": deck, "background": True,
+    })
+    assert r.status_code == 202
+    job_id = r.json()["job_id"]
+    assert admin.get(f"/import/jobs/{job_id}").json()["status"] == "queued"
+    assert len(admin.get(f"/cards?deck_id={deck}").json()["cards"]) == 0
+
+    assert import_worker.run_once() is True
+    job = admin.get(f"/import/jobs/{job_id}").json()
+    assert job["status"] == "done"
+    assert (job["rows_total"], job["rows_parsed"]) == (3, 3)
+    assert (job["imported"], job["skipped"], job["updated"]) == (2, 1, 0)
+    assert len(admin.get(f"/cards?deck_id={deck}").json()["cards"]) == 2
+    assert import_worker.run_once() is False
+
+
+def test_background_import_requeues_on_shutdown(admin, make_deck, monkeypatch):
+    import import_worker
+    import importer
+    monkeypatch.setattr(import_worker, "IMPORT_BATCH_ROWS", 1)
+    monkeypatch.setattr(import_worker, "_stopping", False)
+    publish = importer.ImportState.publish
+
+    def publish_then_stop(self):
+        publish(self)
+        import_worker._stopping = True  # SIGTERM arrives during the first batch
+
+    monkeypatch.setattr(importer.ImportState, "publish", publish_then_stop)
+    deck = make_deck()
+    job_id = admin.post("/import/cards", json={
+        "format": "json", "content": JSON_PAYLOAD, "deck_id": deck, "background": True,
+    }).json()["job_id"]
+
+    assert import_worker.run_once() is True
+    job = admin.get(f"/import/jobs/{job_id}").json()
+    assert job["status"] == "queued"
+    assert (job["rows_total"], job["rows_parsed"], job["imported"]) == (3, 1, 1)
+
+    monkeypatch.setattr(importer.ImportState, "publish", publish)
+    import_worker._stopping = False
+    assert import_worker.run_once() is True  # another worker resumes it
+    job = admin.get(f"/import/jobs/{job_id}").json()
+    assert job["status"] == "done" and job["rows_parsed"] == 3
+    assert (job["imported"], job["skipped"], job["updated"]) == (2, 1, 0)
+
+
+def test_background_import_parse_error_fails_job(admin):
+    import import_worker
+    r = admin.post("/import/cards", json={"format": "json", "content": "{not json",
+                                          "background": True})
+    import_worker.run_once()
+    job = admin.get(f"/import/jobs/{r.json()['job_id']}").json()
+    assert job["status"] == "failed"
+    assert job["error"].startswith("Could not parse")
+
+
+def test_import_job_admin_only(user):
+    assert user.get("/import/jobs/nope").status_code == 403
+
+
+def test_upload_csv_streams_in_batches(admin, make_deck, monkeypatch):
+    import routes.io
+    monkeypatch.setattr(routes.io, "IMPORT_BATCH_ROWS", 2)
+    deck = make_deck()
+    body = (
+        "front,back,labels\r\n"
+        "bonjour,hello,greeting|a1\r\n"
+        "\"two\nlines\",back,\r\n"      # quoted newline inside a field
+        "merci,thanks,a1\r\n"
+        "BONJOUR,HELLO,\r\n"              # repeat of a row from an earlier batch
+        ",no front,\r\n"
+    ).encode()
+    r = admin.post(f"/import/cards/upload?format=csv&deck_id={deck}", content=body)
+    assert r.status_code == 200
+    assert r.json() == {"imported": 3, "skipped": 2, "updated": 0}
+    cards = admin.get(f"/cards?deck_id={deck}&limit=10").json()["cards"]
+    assert [c["front"] for c in cards] == ["bonjour", "two\nlines", "merci"]
+    assert cards[0]["labels"] == ["greeting", "a1"]
+
+
+def test_upload_ndjson(admin, make_deck):
+    deck = make_deck()
+    body = "\n".join(json.dumps(c) for c in json.loads(JSON_PAYLOAD)["cards"]).encode()
+    r = admin.post(f"/import/cards/upload?format=ndjson&deck_id={deck}", content=body)
+    assert r.json() == {"imported": 2, "skipped": 1, "updated": 0}
+
+
+def test_upload_bad_input_400(admin):
+    r = admin.post("/import/cards/upload?format=csv", content=b"question,answer\nq,a\n")
+    assert r.status_code == 400
+    r = admin.post("/import/cards/upload?format=ndjson", content=b'{"front": "a", "back": "b"}\n[1]\n')
+    assert r.status_code == 400
+    assert "line 2" in r.json()["detail"]
+    assert admin.get("/cards").json()["cards"] == []
+
+
 def test_import_into_private_deck_rejected(admin, trusted):
     trusted.post("/cards", json={"front": "x", "back": "y"})  # creates trusted's My Cards deck
     priv = next(d["deck_id"] for d in trusted.get("/decks").json()["decks"] if d["owner_id"])
@@ -117,3 +265,26 @@ def test_import_sanitizes_garbage_chars(admin):
     card = admin.get("/cards").json()["cards"][0]
     assert card["front"] == "a b c"   # control + replacement -> spaces
     assert card["back"] == "x — y"    # em-dash preserved
+
+
+def test_export_json_streams_parseable_document(admin, make_deck):
+    deck = make_deck()
+    admin.post("/import/cards", json={"format": "json", "content": JSON_PAYLOAD, "deck_id": deck})
+    r = admin.get(f"/export/cards?format=json&deck_id={deck}")
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip"  # test client accepts gzip
+    cards = {c["front"]: c for c in r.json()["cards"]}
+    assert cards["bonjour"]["labels"] == ["greeting", "a1"]
+    assert set(cards) == {"bonjour", "merci"}
+
+
+def test_export_empty_json(admin):
+    r = admin.get("/export/cards?format=json", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in r.headers
+    assert r.json() == {"cards": []}
+
+
+def test_export_honors_gzip_q_zero(admin):
+    r = admin.get("/export/cards?format=json", headers={"Accept-Encoding": "gzip;q=0, br"})
+    assert "content-encoding" not in r.headers
+    assert r.json() == {"cards": []}
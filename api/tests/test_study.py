@@ -134,3 +134,216 @@ def test_queue_scoped_to_deck(user, make_card, make_deck):
     q = user.get(f"/study/queue?deck_id={deck}").json()
     assert q["count"] == 1
     assert q["queue"][0]["front"] == "in-deck"
+
+
+def test_queue_new_count_excludes_tracked_cards(user, make_card):
+    seen = make_card(front="seen")
+    for i in range(3):
+        make_card(front=f"n{i}")
+    user.post(f"/cards/{seen}/review", json={"rating": "good"})
+    q = user.get("/study/queue?limit=2").json()
+    assert q["new_count"] == 2
+    assert q["new_remaining"] == 1
+    assert "seen" not in {c["front"] for c in q["queue"]}
+
+
+def test_cached_queue_picks_up_new_and_deleted_cards(admin, user, make_card):
+    keep = make_card(front="keep")
+    assert user.get("/study/queue").json()["count"] == 1  # materializes the queue
+    gone = make_card(front="gone")
+    fronts = {c["front"] for c in user.get("/study/queue").json()["queue"]}
+    assert fronts == {"keep", "gone"}
+    admin.delete(f"/cards/{gone}")
+    q = user.get("/study/queue").json()
+    assert [c["card_id"] for c in q["queue"]] == [keep]
+    assert q["new_remaining"] == 0
+
+
+def test_cached_queue_follows_reviews_and_resets(user, make_card):
+    cid = make_card()
+    make_card()
+    assert user.get("/study/queue").json()["new_count"] == 2
+    user.post(f"/cards/{cid}/review", json={"rating": "good"})
+    assert user.get("/study/queue").json()["new_count"] == 1
+    user.delete(f"/my-progress/{cid}")
+    assert user.get("/study/queue").json()["new_count"] == 2
+
+
+def test_cached_queue_follows_label_edits(admin, user, make_card):
+    cid = make_card(front="a", labels=["ch1"])
+    assert user.get("/study/queue?labels=ch1").json()["count"] == 1
+    admin.put(f"/cards/{cid}", json={"labels": ["ch2"]})
+    assert user.get("/study/queue?labels=ch1").json()["count"] == 0
+
+
+def test_cached_queues_are_indexed_by_deck(user, make_card, make_deck):
+    from redis_client import r0
+    spanish, french = make_deck(name="Spanish"), make_deck(name="French")
+    make_card(front="es1", deck_id=spanish)
+    assert user.get(f"/study/queue?deck_id={spanish}").json()["count"] == 1
+    assert user.get("/study/queue").json()["count"] == 1
+    assert len(r0.smembers(f"studyq:deck:{spanish}")) == 1
+    assert len(r0.smembers("studyq:deck:*")) == 1
+    assert r0.ttl(f"studyq:deck:{spanish}") > 0
+
+    make_card(front="fr1", deck_id=french)
+    make_card(front="es2", deck_id=spanish)
+    fronts = {c["front"] for c in user.get(f"/study/queue?deck_id={spanish}").json()["queue"]}
+    assert fronts == {"es1", "es2"}
+    assert user.get("/study/queue").json()["count"] == 3
+
+
+def test_cached_queue_keys_recreated_by_writes_keep_a_ttl(user, make_card):
+    from redis_client import r0
+    cid = make_card()
+    assert user.get("/study/queue").json()["count"] == 1  # nothing tracked: no due key
+    assert list(r0.scan_iter("studyq:*:due")) == []
+    user.post(f"/cards/{cid}/review", json={"rating": "good"})
+    [due_key] = r0.scan_iter("studyq:*:due")
+    assert r0.ttl(due_key) > 0
+    assert list(r0.scan_iter("studyq:*:new")) == []  # its only card left it
+    user.delete(f"/my-progress/{cid}")
+    [new_key] = r0.scan_iter("studyq:*:new")
+    assert r0.ttl(new_key) > 0
+
+
+def test_batch_review_applies_in_order_and_reports_per_event(user, make_card):
+    a, b = make_card(front="a"), make_card(front="b")
+    r = user.post("/study/reviews", json={"reviews": [
+        {"card_id": a, "rating": "good", "idempotency_key": "k1"},
+        {"card_id": a, "rating": "good", "idempotency_key": "k2"},
+        {"card_id": b, "rating": "bogus", "idempotency_key": "k3"},
+        {"card_id": "nope", "rating": "good", "idempotency_key": "k4"},
+    ]})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["applied"] == 2 and body["failed"] == 2
+    assert [x["ok"] for x in body["results"]] == [True, True, False, False]
+    assert body["results"][1]["review_count"] == 2
+    prog = {c["card_id"]: c["user_progress"] for c in user.get("/cards").json()["cards"]}
+    assert prog[a]["review_count"] == 2
+    assert prog[b]["review_count"] == 0
+
+
+def test_batch_review_retry_is_idempotent(user, make_card):
+    cid = make_card()
+    batch = {"reviews": [{"card_id": cid, "rating": "good", "reviewed_at": "2026-01-01T10:00:00Z"}]}
+    first = user.post("/study/reviews", json=batch).json()["results"][0]
+    again = user.post("/study/reviews", json=batch).json()["results"][0]
+    assert again["duplicate"] is True
+    assert again["idempotency_key"] == first["idempotency_key"]
+    assert again["review_count"] == 1
+    assert user.get("/cards").json()["cards"][0]["user_progress"]["review_count"] == 1
+
+
+def test_batch_review_card_deleted_mid_batch_fails_only_its_events(user, make_card,
+                                                                   monkeypatch):
+    import routes.study
+    from database import SessionLocal
+    from db_models import Card
+    keep, gone = make_card(front="keep"), make_card(front="gone")
+    plan = routes.study._plan_reviews
+
+    def plan_then_delete(*args):
+        planned = plan(*args)
+        db = SessionLocal()
+        try:
+            if db.get(Card, gone) is not None:  # deleted after the visibility check
+                db.delete(db.get(Card, gone))
+                db.commit()
+        finally:
+            db.close()
+        return planned
+
+    monkeypatch.setattr(routes.study, "_plan_reviews", plan_then_delete)
+    r = user.post("/study/reviews", json={"reviews": [
+        {"card_id": keep, "rating": "good"}, {"card_id": gone, "rating": "good"},
+    ]})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["applied"] == 1 and body["failed"] == 1
+    assert body["results"][1] == {"idempotency_key": body["results"][1]["idempotency_key"],
+                                  "card_id": gone, "ok": False, "error": "Card not found"}
+
+
+def test_old_review_receipts_are_pruned(user, make_card):
+    from datetime import datetime, timedelta
+    from sqlalchemy import select, update
+    from database import SessionLocal
+    from db_models import ReviewReceipt
+    import review_receipts
+    a, b = make_card(), make_card()
+    user.post("/study/reviews", json={"reviews": [{"card_id": a, "rating": "good",
+                                                   "idempotency_key": "old"}]})
+    user.post("/study/reviews", json={"reviews": [{"card_id": b, "rating": "good",
+                                                   "idempotency_key": "new"}]})
+    db = SessionLocal()
+    try:
+        db.execute(update(ReviewReceipt).where(ReviewReceipt.idempotency_key == "old")
+                   .values(created_at=datetime.utcnow() - timedelta(days=31)))
+        db.commit()
+        assert review_receipts.prune(db, days=30) == 1
+        assert list(db.scalars(select(ReviewReceipt.idempotency_key))) == ["new"]
+    finally:
+        db.close()
+
+
+def test_batch_review_keeps_notes(user, make_card):
+    cid = make_card()
+    user.put(f"/cards/{cid}/progress", json={"notes": "mine", "flagged": True})
+    user.post("/study/reviews", json={"reviews": [{"card_id": cid, "rating": "easy"}]})
+    prog = user.get("/cards").json()["cards"][0]["user_progress"]
+    assert prog["notes"] == "mine" and prog["flagged"] is True
+
+
+def test_review_chains_fsrs_state_across_reviews(user, make_card):
+    cid = make_card()
+    first = user.post(f"/cards/{cid}/review", json={"rating": "good"}).json()
+    second = user.post(f"/cards/{cid}/review", json={"rating": "good"}).json()
+    assert second["review_count"] == 2
+    assert second["due"] > first["due"]  # stored state fed the second review
+
+
+def test_summary_refreshes_after_own_review(user, make_card):
+    cid = make_card()
+    assert user.get("/my-progress/summary").json()["total_reviews"] == 0
+    user.post(f"/cards/{cid}/review", json={"rating": "again"})
+    s = user.get("/my-progress/summary").json()
+    assert s["total_reviews"] == 1
+    assert s["status_breakdown"]["learning"] == 1
+    assert s["status_breakdown"]["new"] == 0
+
+
+def test_reads_use_replica_until_user_writes(user, make_card, monkeypatch):
+    # "Replica": a second, read-only engine on the same database.
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    import database
+    from redis_client import r0
+
+    replica = create_engine(database.DATABASE_URL,
+                            connect_args={"options": "-c default_transaction_read_only=on"})
+    replica_sessions = sessionmaker(bind=replica)
+    used = []
+
+    def read_session():
+        used.append(1)
+        return replica_sessions()
+
+    monkeypatch.setattr(database, "ReadSessionLocal", read_session)
+    try:
+        cid = make_card()
+        assert user.get("/my-progress").json()["progress"] == []
+        assert len(used) == 1
+
+        assert user.post(f"/cards/{cid}/review", json={"rating": "good"}).status_code == 200
+        # Pinned to the primary right after the write.
+        assert len(user.get("/my-progress").json()["progress"]) == 1
+        assert len(used) == 1
+
+        for key in r0.scan_iter("recent_write:*"):
+            r0.delete(key)
+        assert len(user.get("/my-progress").json()["progress"]) == 1
+        assert len(used) == 2
+    finally:
+        replica.dispose()
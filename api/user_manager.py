@@ -1,7 +1,10 @@
 """User persistence backed by Postgres (SQLAlchemy).
 
 Methods take a request-scoped Session (FastAPI `Depends(get_db)`). Returns ORM
-`User` instances; callers read `.id`, `.email`, `.roles`, etc.
+`User` instances; callers read `.id`, `.email`, `.roles`, etc. Password
+hashing and checks run on the bounded bcrypt pool (password_pool.py) and may
+raise PasswordPoolBusy. The transaction is ended before any bcrypt work, so
+no pooled DB connection is held while a request waits for the pool.
 """
 from datetime import datetime
 from typing import Optional, List
@@ -11,7 +14,7 @@ from sqlalchemy.orm import Session
 
 from db_models import User
 from models import UserCreate
-from jwt_utils import hash_password, verify_password
+from password_pool import password_pool
 
 
 class UserManager:
@@ -19,10 +22,11 @@ class UserManager:
         """Create a new user. Always assigns the plain 'user' role."""
         if self.get_user_by_email(db, user_data.email):
             raise ValueError("User with this email already exists")
+        db.rollback()  # release the connection while bcrypt runs
 
         user = User(
             email=user_data.email,
-            hashed_password=hash_password(user_data.password),
+            hashed_password=password_pool.hash(user_data.password),
             roles=["user"],  # never trust client-supplied roles
             is_active=True,
         )
@@ -36,9 +40,10 @@ class UserManager:
         """Admin path: create a user with explicit roles."""
         if self.get_user_by_email(db, email):
             raise ValueError("User with this email already exists")
+        db.rollback()  # release the connection while bcrypt runs
         user = User(
             email=email,
-            hashed_password=hash_password(password),
+            hashed_password=password_pool.hash(password),
             roles=roles or ["user"],
             is_active=True,
         )
@@ -53,16 +58,33 @@ class UserManager:
     def get_user_by_email(self, db: Session, email: str) -> Optional[User]:
         return db.scalar(select(User).where(User.email == email))
 
-    def authenticate_user(self, db: Session, email: str, password: str) -> Optional[User]:
-        user = self.get_user_by_email(db, email)
+    def login_credentials(self, db: Session, email: str) -> Optional[tuple]:
+        """(user_id, hashed_password) of the active user with this email, or
+        None. Ends the transaction, so the caller can check the password
+        without holding a connection."""
+        row = db.execute(
+            select(User.id, User.hashed_password)
+            .where(User.email == email, User.is_active.is_(True))
+        ).first()
+        db.rollback()
+        return tuple(row) if row else None
+
+    def record_login(self, db: Session, user_id: str) -> Optional[User]:
+        """Stamp last_login once the password checked out; None if the user
+        was deactivated meanwhile."""
+        user = db.get(User, user_id)
         if not user or not user.is_active:
             return None
-        if not verify_password(password, user.hashed_password):
-            return None
         user.last_login = datetime.utcnow()
         db.commit()
         return user
 
+    def authenticate_user(self, db: Session, email: str, password: str) -> Optional[User]:
+        creds = self.login_credentials(db, email)
+        if not creds or not password_pool.verify(password, creds[1]):
+            return None
+        return self.record_login(db, creds[0])
+
     def list_users(self, db: Session) -> List[User]:
         return list(db.scalars(select(User)))
 
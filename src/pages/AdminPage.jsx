@@ -9,6 +9,7 @@ export default function AdminPage() {
   const { user: me } = useAuth();
   const [users, setUsers] = useState([]);
   const [sessions, setSessions] = useState([]);
+  const [sessionsCursor, setSessionsCursor] = useState(null);
   const [error, setError] = useState('');
   const [tab, setTab] = useState('users');
   const [newUser, setNewUser] = useState({ email: '', password: '', roles: ['user'] });
@@ -66,10 +67,13 @@ export default function AdminPage() {
     }
   }, []);
 
-  const loadSessions = useCallback(async () => {
+  // Sessions come a page at a time; `cursor` continues from a previous page.
+  const loadSessions = useCallback(async (cursor = null) => {
     try {
-      const data = await api.get('/api/admin/sessions');
-      setSessions(data.sessions || []);
+      const qs = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const data = await api.get(`/api/admin/sessions${qs}`);
+      setSessions((prev) => (cursor ? [...prev, ...(data.sessions || [])] : data.sessions || []));
+      setSessionsCursor(data.next_cursor || null);
     } catch (err) {
       setError(err.message);
     }
@@ -154,7 +158,7 @@ export default function AdminPage() {
           { key: 'users', label: `Users (${users.length})` },
           { key: 'proposals', label: 'Proposed changes' },
           { key: 'audit', label: 'Audit content' },
-          { key: 'sessions', label: `Sessions (${sessions.length})` },
+          { key: 'sessions', label: `Sessions (${sessions.length}${sessionsCursor ? '+' : ''})` },
         ].map((t) => (
           <button
             key={t.key}
@@ -369,7 +373,7 @@ export default function AdminPage() {
 
       {tab === 'sessions' && (
       <>
-      <h2 className="text-xl font-semibold mb-2">Active Sessions ({sessions.length})</h2>
+      <h2 className="text-xl font-semibold mb-2">Active Sessions ({sessions.length}{sessionsCursor ? '+' : ''})</h2>
       <div className="overflow-x-auto border rounded">
         <table className="w-full text-sm">
           <thead className="bg-gray-50 text-left">
@@ -400,6 +404,11 @@ export default function AdminPage() {
           </tbody>
         </table>
       </div>
+      {sessionsCursor && (
+        <button onClick={() => loadSessions(sessionsCursor)} className="mt-2 text-blue-600 hover:underline">
+          Load more
+        </button>
+      )}
       </>)}
     </div>
   );